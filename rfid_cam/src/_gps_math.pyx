@@ -0,0 +1,26 @@
+# cython: language_level=3
+"""
+Compiled GPS degree/minute/second conversions for image_metadata_manager
+Build in place with: cythonize -i src/_gps_math.pyx
+"""
+
+from libc.math cimport fabs
+
+
+cpdef double dms_to_decimal(long long deg_num, long long deg_den,
+                            long long min_num, long long min_den,
+                            long long sec_num, long long sec_den):
+    """Convert EXIF degree/minute/second rationals to decimal degrees"""
+    return (<double>deg_num / deg_den
+            + (<double>min_num / min_den) / 60.0
+            + (<double>sec_num / sec_den) / 3600.0)
+
+
+cpdef tuple decimal_to_dms(double decimal_degrees):
+    """Convert decimal degrees to (degrees, minutes, seconds * 100)"""
+    cdef double value = fabs(decimal_degrees)
+    cdef long long degrees = <long long>value
+    cdef double minutes_float = (value - degrees) * 60.0
+    cdef long long minutes = <long long>minutes_float
+    cdef double seconds = (minutes_float - minutes) * 60.0
+    return degrees, minutes, <long long>(seconds * 100.0)
@@ -7,24 +7,39 @@ Monitors RS-485 pet microchip reader and captures photos from dual cameras
 import os
 import sys
 import time
+import atexit
 import logging
+import logging.handlers
 import signal
 import re
+import queue
+import threading
+import operator
+import functools
+import json
+import base64
+import secrets
 import subprocess
 import smtplib
+import urllib.request
+import urllib.error
 import ssl
+import string
 from datetime import datetime, timedelta
 from pathlib import Path
+from collections import OrderedDict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 import serial
 from dotenv import load_dotenv
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
 from twilio.base.exceptions import TwilioException
 
 try:
     from picamera2 import Picamera2
+    import simplejpeg  # Installed with picamera2; encodes YUV420 stills directly
 except ImportError:
     print("ERROR: picamera2 not installed. Run: sudo apt install python3-picamera2")
     sys.exit(1)
@@ -32,7 +47,6 @@ except ImportError:
 # OpenAI for animal identification
 try:
     import requests
-    import base64
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
@@ -54,6 +68,18 @@ except ImportError:
     print("WARNING: Image metadata manager not available. Metadata features disabled.")
 
 
+# 15-digit FDX-B tag ID in the reader's data field
+FDXB_PATTERN = re.compile(rb'\d{15}')
+
+# Bounds on the per-tag timestamp caches
+TAG_CACHE_SIZE = 1024
+TAG_CACHE_PURGE_EVERY = 100
+TAG_CACHE_MAX_AGE = 3600  # seconds
+
+# JPEG quality for stills (Picamera2's default when saving)
+JPEG_QUALITY = 90
+
+
 class RFIDCameraSystem:
     """Main application class for RFID camera system"""
     
@@ -68,16 +94,37 @@ class RFIDCameraSystem:
         # Load configuration
         self.config = self.load_config()
         
+        # Address and format are fixed for the run, so build the poll frame once
+        self._poll_command_bytes = self.create_poll_command().encode('ascii')
+        
         # Initialize state
         self.running = False
-        self.last_tag_time = {}  # For deduplication
-        self.last_notification_time = {}  # For notification deduplication (60s)
+        self.last_tag_time = OrderedDict()  # For deduplication
+        self.last_notification_time = OrderedDict()  # For notification deduplication (60s)
+        self._detection_count = 0
+        
+        # Capture and upload workers keep the poll loop free during a detection
+        self._capture_q = queue.Queue(maxsize=3)
+        self._upload_q = queue.Queue()
+        self._workers = []
         
         # Initialize components
         self.serial_conn = None
         self.cameras = {}
         self.twilio_client = None
         self.openai_client = None
+        self._rclone_proc = None
+        self._rc_url = None
+        self._rc_auth = None
+        
+        # Persistent SMTP connection, shared by the upload worker and keepalive timer
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+        self._smtp_timer = None
+        
+        # Static parts of the alert email, filled in per detection
+        self._email_template = string.Template("🐾 Pet detected\nChip: $tag\nDate: $date\nTime: $time")
+        self._is_sms_gateway = '@msg.fi.google.com' in self.config['alert_to_email']  # No subject needed
         
         # Initialize GPS and metadata managers
         self.gps_manager = None
@@ -105,19 +152,25 @@ class RFIDCameraSystem:
         
         # File handler
         log_file = Path('/var/log/rfid_cam.log')
-        file_handler = logging.FileHandler(log_file)
+        file_handler = logging.FileHandler(log_file, delay=True)
         file_formatter = logging.Formatter(
             '%(asctime)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         file_handler.setFormatter(file_formatter)
-        self.logger.addHandler(file_handler)
         
         # Console handler
         console_handler = logging.StreamHandler()
         console_formatter = logging.Formatter('%(levelname)s: %(message)s')
         console_handler.setFormatter(console_formatter)
-        self.logger.addHandler(console_handler)
+        
+        # Records are queued and written by a listener thread so logging on the
+        # poll thread never waits on the SD card
+        log_queue = queue.Queue(-1)
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._log_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+        self._log_listener.start()
+        atexit.register(self._log_listener.stop)  # Flush queued records on exit
         
     def load_config(self):
         """Load configuration from environment variables"""
@@ -133,6 +186,8 @@ class RFIDCameraSystem:
             'photo_dir': Path(os.getenv('PHOTO_DIR', '/home/pi/rfid_photos')),
             'rclone_remote': os.getenv('RCLONE_REMOTE', ''),
             'rclone_path': os.getenv('RCLONE_PATH', 'rfid_photos'),
+            'rclone_rcd': os.getenv('RCLONE_RCD', 'true').lower() == 'true',
+            'rclone_rc_addr': os.getenv('RCLONE_RC_ADDR', '127.0.0.1:5572'),
             'twilio_sid': os.getenv('TWILIO_ACCOUNT_SID', ''),
             'twilio_token': os.getenv('TWILIO_AUTH_TOKEN', ''),
             'twilio_from': os.getenv('TWILIO_FROM', ''),
@@ -176,7 +231,7 @@ class RFIDCameraSystem:
             self.serial_conn = serial.Serial(
                 port=self.config['port'],
                 baudrate=self.config['baud'],
-                timeout=1.0
+                timeout=0.2  # Response window for each poll
             )
             self.logger.info(f"Serial connection established on {self.config['port']} at {self.config['baud']} baud")
             return True
@@ -195,28 +250,32 @@ class RFIDCameraSystem:
                 
             # Initialize camera 0
             self.cameras[0] = Picamera2(0)
+            # YUV420 main stream: half the bytes of RGB and JPEG-encoded from its planes
+            # without a colour conversion. AF is driven by the ISP statistics, not an
+            # output stream, so continuous AF doesn't need the lores stream.
             config0 = self.cameras[0].create_still_configuration(
-                main={"size": (2304, 1296)},  # 3MP still
-                lores={"size": (640, 480)},   # Preview for AF
-                display="lores"
+                main={"size": (2304, 1296), "format": "YUV420"},  # 3MP still
+                buffer_count=2                # Fewer still-size buffers on the Pi Zero
             )
             self.cameras[0].configure(config0)
-            self.cameras[0].set_controls({"AfMode": 2})  # Continuous AF
+            self.cameras[0].set_controls({"AfMode": 2,              # Continuous AF
+                                          "NoiseReductionMode": 0})  # Skip denoise stalls
             self.cameras[0].start()
             
             # Initialize camera 1
             self.cameras[1] = Picamera2(1) 
             config1 = self.cameras[1].create_still_configuration(
-                main={"size": (2304, 1296)},
-                lores={"size": (640, 480)},
-                display="lores"
+                main={"size": (2304, 1296), "format": "YUV420"},
+                buffer_count=2
             )
             self.cameras[1].configure(config1)
-            self.cameras[1].set_controls({"AfMode": 2})  # Continuous AF
+            self.cameras[1].set_controls({"AfMode": 2,              # Continuous AF
+                                          "NoiseReductionMode": 0})
             self.cameras[1].start()
             
-            # Allow time for cameras to initialize
-            time.sleep(2)
+            # Wait for the first frame from each camera rather than a fixed warm-up delay
+            for camera in self.cameras.values():
+                camera.capture_metadata()
             
             self.logger.info("Both cameras initialized successfully")
             return True
@@ -230,13 +289,23 @@ class RFIDCameraSystem:
         # Initialize Twilio if configured
         if self.config['twilio_sid'] and self.config['twilio_token']:
             try:
-                self.twilio_client = Client(self.config['twilio_sid'], self.config['twilio_token'])
+                self.twilio_client = Client(self.config['twilio_sid'], self.config['twilio_token'],
+                                            http_client=TwilioHttpClient(pool_connections=True))
                 self.logger.info("Twilio SMS client initialized")
             except TwilioException as e:
                 self.logger.warning(f"Failed to initialize Twilio: {e}")
                 
-        # Test SMTP if configured
+        # Long-lived rclone daemon so uploads don't launch rclone per photo
+        self.start_rclone_daemon()
+        
+        # Open SMTP connection if configured
         if self.config['smtp_user'] and self.config['smtp_pass']:
+            try:
+                with self._smtp_lock:
+                    self._smtp = self.smtp_connect()
+            except (smtplib.SMTPException, OSError) as e:
+                self.logger.warning(f"SMTP connection failed, will retry on first alert: {e}")
+            self.schedule_smtp_keepalive()
             self.logger.info("Email notifications configured")
             
         # Check OpenAI configuration
@@ -245,24 +314,123 @@ class RFIDCameraSystem:
         else:
             self.logger.info("AI animal identification disabled")
             
+    def start_rclone_daemon(self):
+        """Start an rclone rc daemon for uploads, falling back to the rclone CLI"""
+        if not self.config['rclone_remote'] or not self.config['rclone_rcd']:
+            return
+            
+        # Random per-run credentials, passed via environment to keep them out of ps
+        user, password = 'rfid_cam', secrets.token_urlsafe(16)
+        env = dict(os.environ, RCLONE_RC_USER=user, RCLONE_RC_PASS=password)
+        try:
+            self._rclone_proc = subprocess.Popen(
+                ['rclone', 'rcd', f"--rc-addr={self.config['rclone_rc_addr']}"],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            self.logger.warning(f"Could not start rclone daemon, using rclone CLI: {e}")
+            return
+            
+        self._rc_url = f"http://{self.config['rclone_rc_addr']}/"
+        self._rc_auth = 'Basic ' + base64.b64encode(f"{user}:{password}".encode()).decode('ascii')
+        
+        # Wait for the daemon to accept requests
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and self._rclone_proc.poll() is None:
+            try:
+                self.rc_call('rc/noop', {}, timeout=1)
+                self.logger.info(f"rclone daemon ready on {self.config['rclone_rc_addr']}")
+                return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+                
+        self.logger.warning("rclone daemon not responding, using rclone CLI")
+        self.stop_rclone_daemon()
+        
+    def stop_rclone_daemon(self):
+        """Stop the rclone rc daemon if running"""
+        self._rc_url = None
+        if self._rclone_proc and self._rclone_proc.poll() is None:
+            self._rclone_proc.terminate()
+            try:
+                self._rclone_proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._rclone_proc.kill()
+        self._rclone_proc = None
+        
+    def rc_call(self, command, params, timeout=60):
+        """POST a command to the rclone rc daemon and return its JSON reply"""
+        request = urllib.request.Request(
+            self._rc_url + command,
+            data=json.dumps(params).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Authorization': self._rc_auth},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b'{}')
+            
+    def smtp_connect(self):
+        """Open and authenticate an SMTP connection"""
+        server = smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port'], timeout=30)
+        server.starttls()
+        server.login(self.config['smtp_user'], self.config['smtp_pass'])
+        return server
+        
+    def smtp_close(self):
+        """Close the persistent SMTP connection (caller holds the lock)"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+            
+    def smtp_send(self, msg):
+        """Send over the persistent SMTP connection, reconnecting once if it has dropped"""
+        with self._smtp_lock:
+            for attempt in range(2):
+                try:
+                    if self._smtp is None:
+                        self._smtp = self.smtp_connect()
+                    self._smtp.send_message(msg)
+                    return
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    self.smtp_close()
+                    if attempt:
+                        raise
+                        
+    def schedule_smtp_keepalive(self):
+        """Send a NOOP every 60s so the server doesn't drop the idle connection"""
+        self._smtp_timer = threading.Timer(60, self.smtp_keepalive)
+        self._smtp_timer.daemon = True
+        self._smtp_timer.start()
+        
+    def smtp_keepalive(self):
+        """Keepalive timer callback"""
+        with self._smtp_lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.noop()
+                except (smtplib.SMTPException, OSError):
+                    self.smtp_close()  # Reconnect on next send
+        if self._smtp_timer is not None:
+            self.schedule_smtp_keepalive()
+            
     def calculate_bcc(self, data):
-        """Calculate BCC (XOR checksum) for A04 protocol"""
-        bcc = 0
-        for byte in data.encode('ascii'):
-            bcc ^= byte
-        return f"{bcc:02X}"
+        """Calculate BCC (XOR checksum) for A04 protocol over raw bytes"""
+        return functools.reduce(operator.xor, data, 0)
         
     def create_poll_command(self):
         """Create polling command for A04 reader"""
         addr = self.config['poll_addr']
         fmt = self.config['poll_fmt']
         payload = f"A{addr}01{fmt}"
-        bcc = self.calculate_bcc(payload)
-        return f"${payload}{bcc}#"
+        bcc = self.calculate_bcc(payload.encode('ascii'))
+        return f"${payload}{bcc:02X}#"
         
     def parse_response(self, response):
-        """Parse response from A04 reader and extract 15-digit FDX-B ID"""
-        if not response or not response.startswith('$') or not response.endswith('#'):
+        """Parse a raw response frame from A04 reader and extract 15-digit FDX-B ID"""
+        if not response or not response.startswith(b'$') or not response.endswith(b'#'):
             return None
             
         # Remove frame markers
@@ -273,36 +441,72 @@ class RFIDCameraSystem:
             
         # Extract data portion (skip BCC)
         data = payload[:-2]
-        bcc_received = payload[-2:]
-        
+        try:
+            bcc_received = int(payload[-2:], 16)
+        except ValueError:
+            return None
+            
         # Verify BCC
         bcc_calculated = self.calculate_bcc(data)
         if bcc_calculated != bcc_received:
-            self.logger.warning(f"BCC mismatch: calculated {bcc_calculated}, received {bcc_received}")
+            self.logger.warning(f"BCC mismatch: calculated {bcc_calculated:02X}, received {bcc_received:02X}")
             return None
             
-        # Look for 15-digit FDX-B ID pattern in the data
-        fdx_match = re.search(r'(\d{15})', data)
+        # Look for 15-digit FDX-B ID pattern in the data (short frames can't hold one)
+        if len(data) < 15:
+            return None
+        fdx_match = FDXB_PATTERN.search(data)
         if fdx_match:
-            return fdx_match.group(1)
+            return fdx_match.group().decode('ascii')
             
         return None
         
     def is_duplicate_tag(self, tag_id):
-        """Check if this tag was recently detected (deduplication) - DISABLED for testing"""
-        # Deduplication disabled - process every scan
-        self.last_tag_time[tag_id] = datetime.now()
+        """Check if this tag was recently detected (deduplication) - DEDUPE_SECONDS=0 disables"""
+        # Monotonic seconds: cheap to read and unaffected by NTP clock steps
+        now = time.monotonic()
+        prev = self.last_tag_time.get(tag_id)
+        if prev is not None and now - prev < self.config['dedupe_seconds']:
+            self.last_tag_time.move_to_end(tag_id)  # Keep busy tags at the warm end of the LRU
+            return True
+        self.remember_tag(self.last_tag_time, tag_id, now)
+        
+        # Opportunistically drop tags that haven't been seen for a while
+        self._detection_count += 1
+        if self._detection_count % TAG_CACHE_PURGE_EVERY == 0:
+            for cache in (self.last_tag_time, self.last_notification_time):
+                for cached_tag, seen in list(cache.items()):
+                    if now - seen > TAG_CACHE_MAX_AGE:
+                        cache.pop(cached_tag, None)  # May already be evicted by the upload worker
         return False
         
-    def capture_photos(self, tag_id):
+    def remember_tag(self, cache, tag_id, timestamp):
+        """Record a tag timestamp, evicting the least recently seen tag past the cap"""
+        cache[tag_id] = timestamp
+        cache.move_to_end(tag_id)
+        if len(cache) > TAG_CACHE_SIZE:
+            cache.popitem(last=False)
+        
+    def encode_yuv420(self, image, size):
+        """JPEG-encode a YUV420 frame from make_array (Y rows then U and V planes, stride wide)"""
+        width, height = size
+        stride = image.shape[1]
+        y = image[:height, :width]
+        u, v = image[height:height * 3 // 2].reshape(2, height // 2, stride // 2)
+        return simplejpeg.encode_jpeg_yuv_planes(y, u[:, :width // 2], v[:, :width // 2],
+                                                 quality=JPEG_QUALITY)
+        
+    def capture_photos(self, tag_id, detected_at=None):
         """Capture photos from both cameras with GPS and metadata"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        detected_at = detected_at or datetime.now()
+        timestamp = detected_at.strftime("%Y%m%d_%H%M%S")
         photo_paths = []
+        metadata_items = []
         
         # Get GPS coordinates if available
         gps_coordinates = None
         if self.gps_manager:
-            gps_coordinates = self.gps_manager.get_current_location()
+            gps_coordinates = self.gps_manager.get_coordinates_for_exif()
         
         for cam_id in [0, 1]:
             if cam_id not in self.cameras:
@@ -313,35 +517,41 @@ class RFIDCameraSystem:
                 filename = f"{timestamp}_{tag_id}_cam{cam_id}.jpg"
                 filepath = self.config['photo_dir'] / filename
                 
-                # Capture still image
-                self.cameras[cam_id].capture_file(str(filepath))
-                
-                # Add metadata if available
-                if self.metadata_manager and filepath.exists():
-                    try:
-                        # Create metadata for this photo
-                        metadata = {
-                            'chip_id': tag_id,
-                            'camera_id': cam_id,
-                            'timestamp': timestamp,
-                            'gps_coordinates': gps_coordinates,
-                            'system_version': 'v2.1.0',
-                        }
-                        
-                        # Embed metadata in photo and save JSON
-                        self.metadata_manager.add_metadata_to_photo(
-                            str(filepath), metadata, gps_coordinates
-                        )
-                        
-                    except Exception as e:
-                        self.logger.warning(f"Failed to add metadata to {filepath}: {e}")
+                # Capture still image straight from the camera's buffer, releasing it
+                # promptly so libcamera doesn't run out of buffers. The JPEG goes to
+                # local disk rather than being streamed to rclone: metadata is embedded
+                # into the file and AI analysis reads it back, and the upload that
+                # follows is served from the page cache.
+                request = self.cameras[cam_id].capture_request()
+                try:
+                    # request.save() goes through PIL, which can't take YUV420
+                    jpeg = self.encode_yuv420(request.make_array('main'),
+                                              self.cameras[cam_id].camera_config['main']['size'])
+                finally:
+                    request.release()
+                filepath.write_bytes(jpeg)
                 
                 photo_paths.append(filepath)
-                self.logger.info(f"Photo saved with metadata: {filepath}")
+                metadata_items.append({
+                    'image_path': str(filepath),
+                    'chip_id': tag_id,
+                    'camera_id': cam_id,
+                    'gps_coordinates': gps_coordinates,
+                    'detection_time': detected_at,
+                    'additional_info': {'system_version': 'v2.1.0'}
+                })
+                self.logger.info(f"Photo saved: {filepath}")
                 
             except Exception as e:
                 self.logger.error(f"Failed to capture photo from camera {cam_id}: {e}")
                 
+        # Embed metadata and write sidecars for both cameras' photos concurrently
+        if self.metadata_manager and metadata_items:
+            try:
+                self.metadata_manager.process_image_metadata_batch(metadata_items)
+            except Exception as e:
+                self.logger.warning(f"Failed to add metadata to photos for {tag_id}: {e}")
+                
         return photo_paths
         
     def upload_photos(self, photo_paths):
@@ -358,50 +568,25 @@ class RFIDCameraSystem:
             
             for attempt in range(1, attempts + 1):
                 try:
-                    # Upload to cloud storage with increased timeout
-                    cmd = [
-                        'rclone', 'copy',
-                        str(photo_path),
-                        f"{self.config['rclone_remote']}:{self.config['rclone_path']}",
-                        '--progress'
-                    ]
-                    
-                    subprocess.run(cmd, check=True, timeout=60, capture_output=True)
+                    if self._rc_url:
+                        file_id = self.upload_photo_rc(photo_path)
+                    else:
+                        file_id = self.upload_photo_cli(photo_path)
                     self.logger.info(f"Uploaded: {photo_path.name} (attempt {attempt})")
                     
-                    # Get the file ID for the uploaded file
-                    try:
-                        id_cmd = [
-                            'rclone', 'lsjson', 
-                            f"{self.config['rclone_remote']}:{self.config['rclone_path']}/{photo_path.name}"
-                        ]
-                        result = subprocess.run(id_cmd, capture_output=True, text=True, timeout=10)
-                        if result.returncode == 0:
-                            import json
-                            file_info = json.loads(result.stdout)
-                            if file_info and len(file_info) > 0:
-                                file_id = file_info[0].get('ID')
-                                if file_id:
-                                    link = f"https://drive.google.com/file/d/{file_id}/view"
-                                    photo_links.append(link)
-                                    self.logger.info(f"Generated link: {link}")
-                                    success = True
-                                    upload_results['successful'] += 1
-                                    break
-                                else:
-                                    self.logger.warning(f"No file ID found for {photo_path.name}")
-                            else:
-                                self.logger.warning(f"No file info returned for {photo_path.name}")
-                        else:
-                            self.logger.warning(f"Failed to get file ID for {photo_path.name}")
-                    except Exception as e:
-                        self.logger.warning(f"Could not get file ID for {photo_path.name}: {e}")
+                    if file_id:
+                        link = f"https://drive.google.com/file/d/{file_id}/view"
+                        photo_links.append(link)
+                        self.logger.info(f"Generated link: {link}")
+                        success = True
+                        upload_results['successful'] += 1
+                        break
                     
-                except subprocess.CalledProcessError as e:
+                except (subprocess.CalledProcessError, urllib.error.HTTPError) as e:
                     self.logger.error(f"Upload failed for {photo_path.name} (attempt {attempt}): {e}")
                     if attempt == attempts:
                         upload_results['failed'] += 1
-                except subprocess.TimeoutExpired:
+                except (subprocess.TimeoutExpired, TimeoutError):
                     self.logger.warning(f"Upload timeout for {photo_path.name} (attempt {attempt})")
                     if attempt == attempts:
                         upload_results['failed'] += 1
@@ -415,8 +600,61 @@ class RFIDCameraSystem:
                     time.sleep(2)  # Brief delay before retry
         
         return photo_links, upload_results
-                
-        return photo_links
+        
+    def upload_photo_cli(self, photo_path):
+        """Upload one photo with the rclone CLI and return its Drive file ID"""
+        # Upload to cloud storage with increased timeout
+        cmd = [
+            'rclone', 'copy',
+            str(photo_path),
+            f"{self.config['rclone_remote']}:{self.config['rclone_path']}",
+            '--progress'
+        ]
+        subprocess.run(cmd, check=True, timeout=60, capture_output=True)
+        
+        # Get the file ID for the uploaded file
+        try:
+            id_cmd = [
+                'rclone', 'lsjson', 
+                f"{self.config['rclone_remote']}:{self.config['rclone_path']}/{photo_path.name}"
+            ]
+            result = subprocess.run(id_cmd, capture_output=True, text=True, timeout=10)
+            if result.returncode == 0:
+                file_info = json.loads(result.stdout)
+                if file_info and len(file_info) > 0:
+                    file_id = file_info[0].get('ID')
+                    if file_id:
+                        return file_id
+                    self.logger.warning(f"No file ID found for {photo_path.name}")
+                else:
+                    self.logger.warning(f"No file info returned for {photo_path.name}")
+            else:
+                self.logger.warning(f"Failed to get file ID for {photo_path.name}")
+        except Exception as e:
+            self.logger.warning(f"Could not get file ID for {photo_path.name}: {e}")
+        return None
+        
+    def upload_photo_rc(self, photo_path):
+        """Upload one photo through the rclone daemon and return its Drive file ID"""
+        remote_fs = f"{self.config['rclone_remote']}:"
+        remote_path = f"{self.config['rclone_path']}/{photo_path.name}"
+        self.rc_call('operations/copyfile', {
+            'srcFs': str(photo_path.parent),
+            'srcRemote': photo_path.name,
+            'dstFs': remote_fs,
+            'dstRemote': remote_path
+        })
+        
+        # Get the file ID for the uploaded file
+        try:
+            item = self.rc_call('operations/stat', {'fs': remote_fs, 'remote': remote_path},
+                                timeout=10).get('item')
+            if item and item.get('ID'):
+                return item['ID']
+            self.logger.warning(f"No file ID found for {photo_path.name}")
+        except Exception as e:
+            self.logger.warning(f"Could not get file ID for {photo_path.name}: {e}")
+        return None
                 
     def analyze_individual_photo(self, photo_path):
         """Analyze a single photo using OpenAI Vision API"""
@@ -520,7 +758,7 @@ class RFIDCameraSystem:
             return False
             
         # Notification deduplication disabled - send notification for every scan
-        self.last_notification_time[tag_id] = datetime.now()
+        self.remember_tag(self.last_notification_time, tag_id, time.monotonic())
         return True
         
     def send_sms(self, tag_id, photo_paths=None):
@@ -564,15 +802,13 @@ class RFIDCameraSystem:
             return
             
         try:
-            # Check if this is SMS gateway (no subject needed)
-            is_sms_gateway = '@msg.fi.google.com' in self.config['alert_to_email']
+            is_sms_gateway = self._is_sms_gateway
             
             # Create concise message
             now = datetime.now()
-            date_str = now.strftime('%A, %B %d, %Y')
-            time_str = now.strftime('%H:%M')
-            
-            body = f"🐾 Pet detected{chr(10)}Chip: {tag_id}{chr(10)}Date: {date_str}{chr(10)}Time: {time_str}"
+            body = self._email_template.substitute(
+                tag=tag_id, date=now.strftime('%A, %B %d, %Y'), time=now.strftime('%H:%M')
+            )
             
             # Add AI summary if available
             if hasattr(self, '_ai_summary') and self._ai_summary:
@@ -615,11 +851,8 @@ class RFIDCameraSystem:
             if not is_sms_gateway:
                 msg['Subject'] = f"Pet Detection Alert - {tag_id}"
             
-            # Create SMTP session
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            # Send over the persistent SMTP session
+            self.smtp_send(msg)
                 
             ai_info = getattr(self, '_ai_summary', 'None')
             self.logger.info(f"Complete notification sent - SMS mode: {is_sms_gateway}, Links: {len(photo_links) if photo_links else 0}, AI: {ai_info}")
@@ -628,37 +861,88 @@ class RFIDCameraSystem:
             self.logger.error(f"Failed to send email: {e}")
             
     def process_tag(self, tag_id):
-        """Process a detected tag - capture, upload, analyze, then notify"""
+        """Process a detected tag - queue it for capture, upload, analysis and notification"""
         self.logger.info(f"Tag detected: {tag_id}")
         
-        photo_paths = []
+        try:
+            self._capture_q.put_nowait((tag_id, datetime.now()))
+        except queue.Full:
+            self.logger.warning(f"Capture queue full, dropping detection of {tag_id}")
+            
+    def _capture_worker(self):
+        """Capture photos for queued detections and hand them to the upload worker"""
+        while True:
+            item = self._capture_q.get()
+            if item is None:  # Shutdown sentinel - pass it on once captures are done
+                self._upload_q.put(None)
+                break
+                
+            tag_id, detected_at = item
+            photo_paths = []
+            
+            # Step 1: Capture photos
+            if self.config['capture_on_any']:
+                self.logger.info("Step 1: Capturing photos...")
+                try:
+                    photo_paths = self.capture_photos(tag_id, detected_at)
+                except Exception as e:
+                    self.logger.error(f"Capture failed for {tag_id}: {e}")
+                    
+            self._upload_q.put((tag_id, photo_paths))
+            
+    def _upload_worker(self):
+        """Upload, analyze and notify for captured detections"""
+        while True:
+            item = self._upload_q.get()
+            if item is None:  # Shutdown sentinel
+                break
+                
+            tag_id, photo_paths = item
+            try:
+                self.finish_tag(tag_id, photo_paths)
+            except Exception as e:
+                self.logger.error(f"Error processing tag {tag_id}: {e}")
+                
+    def finish_tag(self, tag_id, photo_paths):
+        """Upload and analyze captured photos, then notify"""
         photo_links = []
-        ai_description = None
         
-        # Step 1: Capture photos
-        if self.config['capture_on_any']:
-            self.logger.info("Step 1: Capturing photos...")
-            photo_paths = self.capture_photos(tag_id)
+        if photo_paths:
+            # Step 2: Upload photos and get real links
+            self.logger.info("Step 2: Uploading photos and generating links...")
+            photo_links, upload_results = self.upload_photos(photo_paths)
+            self._last_upload_results = upload_results  # Store for SMS formatting
             
-            if photo_paths:
-                # Step 2: Upload photos and get real links
-                self.logger.info("Step 2: Uploading photos and generating links...")
-                photo_links, upload_results = self.upload_photos(photo_paths)
-                self._last_upload_results = upload_results  # Store for SMS formatting
-                
-                # Step 3: Analyze with AI (individual photos + summary)
-                if OPENAI_AVAILABLE and self.config['openai_api_key'] and self.config['animal_identification']:
-                    self.logger.info("Step 3: Analyzing photos individually with AI...")
-                    ai_individual, ai_summary = self.analyze_photos_with_ai(photo_paths)
-                    self._ai_individual = ai_individual
-                    self._ai_summary = ai_summary
+            # Step 3: Analyze with AI (individual photos + summary)
+            if OPENAI_AVAILABLE and self.config['openai_api_key'] and self.config['animal_identification']:
+                self.logger.info("Step 3: Analyzing photos individually with AI...")
+                ai_individual, ai_summary = self.analyze_photos_with_ai(photo_paths)
+                self._ai_individual = ai_individual
+                self._ai_summary = ai_summary
                 
+            # Nothing reads the photos again, so don't let them crowd the page cache
+            self.release_page_cache(photo_paths)
+            
         # Step 4: Send complete notification if this is the lost tag
         if self.should_notify(tag_id):
             self.logger.info(f"Step 4: Sending complete notification for lost tag: {tag_id}")
             self.send_sms(tag_id, photo_paths)
             self.send_email(tag_id, photo_paths, photo_links)
             
+    def release_page_cache(self, photo_paths):
+        """Ask the kernel to drop cached pages for files we're done with"""
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        for photo_path in photo_paths:
+            try:
+                fd = os.open(photo_path, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                self.logger.debug(f"fadvise failed for {photo_path}: {e}")
+                
     def run(self):
         """Main application loop"""
         self.logger.info("Initializing system components...")
@@ -674,41 +958,45 @@ class RFIDCameraSystem:
             
         self.initialize_notifications()
         
+        for worker in (self._capture_worker, self._upload_worker):
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            self._workers.append(thread)
+        
         self.logger.info("System initialized successfully, starting main loop...")
         
         self.running = True
-        poll_command = self.create_poll_command()
+        next_poll = time.monotonic()
         
         try:
             while self.running:
                 try:
                     # Send poll command
-                    self.serial_conn.write(poll_command.encode('ascii'))
+                    self.serial_conn.write(self._poll_command_bytes)
                     
-                    # Read response with timeout (fast response)
-                    response = ''
-                    start_time = time.time()
-                    while time.time() - start_time < 0.2:
-                        if self.serial_conn.in_waiting > 0:
-                            data = self.serial_conn.read(self.serial_conn.in_waiting)
-                            response += data.decode('ascii', errors='ignore')
-                            
-                            # Check if we have a complete frame
-                            if response.endswith('#'):
-                                break
-                                
-                    # Process response if we got one
-                    if response:
+                    # Read response - returns as soon as the frame terminator arrives,
+                    # or when the serial timeout expires
+                    response = self.serial_conn.read_until(expected=b'#', size=64)
+                    
+                    # Process response if we got a complete frame
+                    if response.endswith(b'#'):
                         tag_id = self.parse_response(response)
                         if tag_id and not self.is_duplicate_tag(tag_id):
                             self.process_tag(tag_id)
                             
-                    # Wait before next poll
-                    time.sleep(self.config['poll_interval'])
+                    # Poll on a fixed cadence: wait only for the rest of the interval
+                    # that started with this poll, not a full interval after the reply
+                    next_poll += self.config['poll_interval']
+                    delay = next_poll - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_poll = time.monotonic()  # Fell behind - don't burst to catch up
                     
                 except serial.SerialException as e:
                     self.logger.error(f"Serial communication error: {e}")
                     time.sleep(5)  # Wait before retrying
+                    next_poll = time.monotonic()
                     
         except KeyboardInterrupt:
             self.logger.info("Received keyboard interrupt")
@@ -719,6 +1007,22 @@ class RFIDCameraSystem:
         """Clean up resources"""
         self.logger.info("Cleaning up resources...")
         
+        # Let queued detections finish before cameras and managers go away
+        if self._workers:
+            self._capture_q.put(None)
+            for thread in self._workers:
+                thread.join(timeout=120)
+            self.logger.info("Capture and upload workers stopped")
+            
+        self.stop_rclone_daemon()
+        
+        # Close SMTP connection
+        if self._smtp_timer is not None:
+            timer, self._smtp_timer = self._smtp_timer, None
+            timer.cancel()
+        with self._smtp_lock:
+            self.smtp_close()
+        
         # Close GPS manager
         if self.gps_manager:
             try:
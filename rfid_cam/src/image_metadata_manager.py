@@ -7,19 +7,129 @@ Handles EXIF metadata, GPS data embedding, and AI description tagging
 import os
 import sys
 import json
+import zlib
 import logging
+import atexit
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, List
 from pathlib import Path
 
+# PIL and piexif are imported on first use (see _load_exif_libs) so importing this
+# module does not delay reader startup; availability is checked without importing
+EXIF_AVAILABLE = (importlib.util.find_spec('PIL') is not None and
+                  importlib.util.find_spec('piexif') is not None)
+if not EXIF_AVAILABLE:
+    logging.warning("EXIF dependencies not installed. Run: pip install Pillow piexif")
+
+Image = piexif = ImageIFD = ExifIFD = GPSIFD = None
+
+
+def _load_exif_libs() -> bool:
+    """Import PIL and piexif on first use; returns EXIF availability"""
+    global Image, piexif, ImageIFD, ExifIFD, GPSIFD, EXIF_AVAILABLE
+    if piexif is not None or not EXIF_AVAILABLE:
+        return EXIF_AVAILABLE
+    
+    try:
+        from PIL import Image as pil_image
+        import piexif as piexif_module
+    except ImportError:
+        EXIF_AVAILABLE = False
+        logging.warning("EXIF dependencies failed to import. Run: pip install Pillow piexif")
+        return False
+    
+    Image = pil_image
+    ImageIFD, ExifIFD, GPSIFD = piexif_module.ImageIFD, piexif_module.ExifIFD, piexif_module.GPSIFD
+    piexif = piexif_module  # Bound last: other threads treat it as the "loaded" flag
+    return True
+
+METADATA_VERSION = '2.0.0'
+SYSTEM_NAME = 'pet-chip-reader'
+
+# Embedded UserComment JSON is zlib-compressed behind this marker; payloads over
+# the cap are skipped (APP1 segments are limited to 64KB) and live only in the sidecar
+USER_COMMENT_PREFIX = b'ZJSON'
+USER_COMMENT_MAX_BYTES = 60_000
+
+# Buffered Parquet sidecar rows are written out as one complete file (a single
+# row group) once this many accumulate, or this many seconds after the first
+PARQUET_FLUSH_ROWS = 128
+PARQUET_FLUSH_SECONDS = 300
+
 try:
-    from PIL import Image, ExifTags
-    from PIL.ExifTags import TAGS, GPSTAGS
-    import piexif
-    EXIF_AVAILABLE = True
+    import orjson
+    ORJSON_AVAILABLE = True
 except ImportError:
-    EXIF_AVAILABLE = False
-    logging.warning("EXIF dependencies not installed. Run: pip install Pillow piexif")
+    ORJSON_AVAILABLE = False
+
+
+def _json_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes, using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, default=str, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), default=str, ensure_ascii=False).encode('utf-8')
+
+
+def _metadata_row(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a metadata dict into one Parquet sidecar row"""
+    image = metadata.get('image', {})
+    detection = metadata.get('detection', {})
+    location = metadata.get('location') or {}
+    ai_analysis = metadata.get('ai_analysis') or {}
+    return {
+        'chip_id': detection.get('chip_id'),
+        'camera_id': image.get('camera_id'),
+        'detection_time': detection.get('detection_time'),
+        'filename': image.get('filename'),
+        'path': image.get('path'),
+        'width': image.get('width'),
+        'height': image.get('height'),
+        'file_size': image.get('file_size'),
+        'latitude': location.get('latitude'),
+        'longitude': location.get('longitude'),
+        'altitude': location.get('altitude'),
+        'ai_description': ai_analysis.get('description'),
+        'metadata_json': _json_bytes(metadata).decode('utf-8')
+    }
+
+
+def _dms_to_decimal_kernel(deg_num, deg_den, min_num, min_den, sec_num, sec_den):
+    """Convert EXIF degree/minute/second rationals to decimal degrees"""
+    return deg_num / deg_den + (min_num / min_den) / 60 + (sec_num / sec_den) / 3600
+
+
+def _decimal_to_dms_kernel(decimal_degrees):
+    """Convert decimal degrees to (degrees, minutes, seconds * 100)"""
+    value = abs(decimal_degrees)
+    degrees = int(value)
+    minutes_float = (value - degrees) * 60
+    minutes = int(minutes_float)
+    seconds = (minutes_float - minutes) * 60
+    return degrees, minutes, int(seconds * 100)
+
+
+# Prefer the ahead-of-time compiled Cython extension (src/_gps_math.pyx), then
+# Numba, then the pure Python kernels above
+try:
+    from _gps_math import dms_to_decimal as _dms_to_decimal_kernel
+    from _gps_math import decimal_to_dms as _decimal_to_dms_kernel
+    GPS_MATH_BACKEND = 'cython'
+except ImportError:
+    try:
+        from numba import njit
+        # Explicit signatures compile eagerly at import (and cache to disk), so the
+        # first capture never pays the JIT cost
+        _dms_to_decimal_kernel = njit('float64(int64, int64, int64, int64, int64, int64)',
+                                      cache=True)(_dms_to_decimal_kernel)
+        _decimal_to_dms_kernel = njit('UniTuple(int64, 3)(float64)', cache=True)(_decimal_to_dms_kernel)
+        GPS_MATH_BACKEND = 'numba'
+    except ImportError:
+        GPS_MATH_BACKEND = 'python'
 
 
 class ImageMetadataManager:
@@ -36,11 +146,43 @@ class ImageMetadataManager:
         self.embed_metadata = config.get('EMBED_METADATA', 'true').lower() == 'true'
         self.save_json_files = config.get('SAVE_METADATA_JSON', 'true').lower() == 'true'
         self.metadata_quality = config.get('METADATA_QUALITY', 'high').lower()
+        self.sidecar_format = config.get('SIDECAR_FORMAT', 'json').lower()
+        
+        if self.sidecar_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            self.logger.warning("pyarrow not available - falling back to JSON sidecar files")
+            self.sidecar_format = 'json'
+        
+        # Parquet sidecar rows, buffered per directory/day and flushed to finished files
+        self._parquet_rows = []
+        self._parquet_key = None
+        self._parquet_schema = None
+        self._parquet_timer = None
+        self._parquet_lock = threading.Lock()
         
         if self.embed_metadata and not EXIF_AVAILABLE:
             self.logger.warning("EXIF libraries not available - metadata embedding disabled")
             self.embed_metadata = False
         
+        # Invariant metadata, computed once instead of on every capture
+        uname = os.uname() if hasattr(os, 'uname') else None
+        self._system_info = {
+            'hostname': uname.nodename if uname else 'unknown',
+            'system': uname.sysname if uname else 'unknown',
+            'python_version': f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
+        }
+        self._software_tag = f"{SYSTEM_NAME} v{METADATA_VERSION}"
+        
+        # Constant EXIF fields merged into every image (built once piexif is loaded)
+        self._exif_0th_template = None
+        self._gps_template = None
+        
+        # Worker pool for multi-camera batches (JPEG/file I/O releases the GIL),
+        # started on the first batch so single-camera callers never pay for it
+        self._max_workers = int(config.get('METADATA_WORKERS', min(4, os.cpu_count() or 1)))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._close_registered = False
+        
         self.logger.info(f"Image Metadata Manager initialized - Embedding: {self.embed_metadata}")
     
     def create_comprehensive_metadata(self, 
@@ -50,7 +192,8 @@ class ImageMetadataManager:
                                     gps_coordinates: Optional[Tuple[float, float, Optional[float]]] = None,
                                     ai_description: Optional[str] = None,
                                     detection_time: Optional[datetime] = None,
-                                    additional_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                                    additional_info: Optional[Dict[str, Any]] = None,
+                                    image_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Create comprehensive metadata for an image
         
@@ -62,31 +205,37 @@ class ImageMetadataManager:
             ai_description: AI-generated description of the animal
             detection_time: When the detection occurred
             additional_info: Any additional metadata
+            image_info: Image properties already read by _read_image_header
             
         Returns:
             Dictionary containing all metadata
         """
+        # Read the clock at most once; reused for analyzed_at when no time was given
+        now_iso = None
         if not detection_time:
             detection_time = datetime.now(timezone.utc)
+            now_iso = detection_time.isoformat()
+        detection_iso = now_iso or detection_time.isoformat()
         
         # Base metadata
         metadata = {
-            'version': '2.0.0',
-            'system': 'pet-chip-reader',
-            'created': detection_time.isoformat(),
+            'version': METADATA_VERSION,
+            'system': SYSTEM_NAME,
+            'created': detection_iso,
             'image': {
                 'filename': Path(image_path).name,
                 'path': str(image_path),
                 'camera_id': camera_id,
-                'capture_timestamp': detection_time.isoformat()
+                'capture_timestamp': detection_iso
             },
             'detection': {
                 'chip_id': chip_id,
-                'detection_time': detection_time.isoformat(),
+                'detection_time': detection_iso,
                 'detection_date': detection_time.strftime('%Y-%m-%d'),
                 'detection_day': detection_time.strftime('%A'),
                 'detection_hour': detection_time.hour,
-                'timezone': str(detection_time.tzinfo)
+                'timezone': str(detection_time.tzinfo),
+                'exif_datetime': detection_time.strftime('%Y:%m:%d %H:%M:%S')
             }
         }
         
@@ -110,101 +259,137 @@ class ImageMetadataManager:
         if ai_description:
             metadata['ai_analysis'] = {
                 'description': ai_description,
-                'analyzed_at': datetime.now(timezone.utc).isoformat(),
+                'analyzed_at': now_iso or datetime.now(timezone.utc).isoformat(),
                 'model': 'openai-gpt4-vision',
                 'confidence': 'high'  # Could be enhanced with actual confidence scores
             }
         
         # Add image technical details
-        if os.path.exists(image_path):
-            try:
-                with Image.open(image_path) as img:
-                    metadata['image'].update({
-                        'width': img.width,
-                        'height': img.height,
-                        'format': img.format,
-                        'mode': img.mode,
-                        'file_size': os.path.getsize(image_path)
-                    })
-            except Exception as e:
-                self.logger.debug(f"Could not read image properties: {e}")
+        if image_info is None:
+            image_info, _ = self._read_image_header(image_path)
+        if image_info:
+            metadata['image'].update(image_info)
         
         # Add additional information
         if additional_info:
             metadata.update(additional_info)
         
         # Add system information
-        metadata['system_info'] = {
-            'hostname': os.uname().nodename if hasattr(os, 'uname') else 'unknown',
-            'system': os.uname().sysname if hasattr(os, 'uname') else 'unknown',
-            'python_version': f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
-        }
+        metadata['system_info'] = dict(self._system_info)
         
         return metadata
     
-    def embed_exif_metadata(self, image_path: str, metadata: Dict[str, Any]) -> bool:
+    def _read_image_header(self, image_path: str) -> Tuple[Dict[str, Any], bytes]:
+        """
+        Read image properties and raw EXIF bytes with a single open
+        
+        Returns:
+            (image properties dict, existing EXIF bytes) - empty values if unreadable
+        """
+        if not _load_exif_libs():
+            return {}, b''
+        
+        # Single stat covers both the existence check and the file size
+        try:
+            file_size = os.stat(image_path).st_size
+        except OSError:
+            return {}, b''
+        
+        try:
+            # Image.open parses only the header; these attributes are available
+            # without decoding pixels, so never call .load() or touch pixel data here
+            with Image.open(image_path) as img:
+                image_info = {
+                    'width': img.width,
+                    'height': img.height,
+                    'format': img.format,
+                    'mode': img.mode,
+                    'file_size': file_size
+                }
+                return image_info, img.info.get('exif', b'')
+        except Exception as e:
+            self.logger.debug(f"Could not read image properties: {e}")
+            return {}, b''
+    
+    def embed_exif_metadata(self, image_path: str, metadata: Dict[str, Any],
+                            exif_bytes: Optional[bytes] = None) -> bool:
         """
         Embed metadata into image EXIF data
         
+        The EXIF segment is spliced into the existing JPEG with piexif.insert,
+        so pixel data is never decoded or re-encoded.
+        
         Args:
             image_path: Path to the image file
             metadata: Metadata dictionary to embed
+            exif_bytes: Existing EXIF bytes if already read by _read_image_header
             
         Returns:
             True if successful, False otherwise
         """
-        if not self.embed_metadata or not EXIF_AVAILABLE:
+        if not self.embed_metadata or not _load_exif_libs():
             return False
         
+        if self._exif_0th_template is None:
+            self._exif_0th_template = {
+                ImageIFD.Software: self._software_tag,
+                ImageIFD.Artist: "Pet Chip Reader System"
+            }
+            self._gps_template = {
+                GPSIFD.GPSVersionID: (2, 0, 0, 0),
+                GPSIFD.GPSMapDatum: 'WGS-84'
+            }
+        
         try:
-            # Load existing EXIF data
-            img = Image.open(image_path)
-            exif_dict = piexif.load(img.info.get('exif', b''))
+            # Load existing EXIF data (piexif reads only the APP1 segment from disk
+            # and returns empty IFDs when the file has no EXIF yet)
+            exif_dict = piexif.load(exif_bytes or image_path)
             
-            # Update basic EXIF fields
-            detection_time = datetime.fromisoformat(metadata['detection']['detection_time'].replace('Z', '+00:00'))
+            detection = metadata['detection']
+            location = metadata.get('location')
+            ai_analysis = metadata.get('ai_analysis')
+            chip_id = detection['chip_id']
             
-            # Format datetime for EXIF (YYYY:MM:DD HH:MM:SS format)
-            exif_datetime = detection_time.strftime('%Y:%m:%d %H:%M:%S')
+            # Update basic EXIF fields - datetime pre-formatted for EXIF
+            # (YYYY:MM:DD HH:MM:SS) by create_comprehensive_metadata
+            exif_datetime = detection.get('exif_datetime')
+            if not exif_datetime:
+                detection_time = datetime.fromisoformat(detection['detection_time'].replace('Z', '+00:00'))
+                exif_datetime = detection_time.strftime('%Y:%m:%d %H:%M:%S')
             
             # Update 0th IFD (main image data)
-            exif_dict['0th'][piexif.ImageIFD.DateTime] = exif_datetime
-            exif_dict['0th'][piexif.ImageIFD.Software] = f"pet-chip-reader v{metadata['version']}"
-            exif_dict['0th'][piexif.ImageIFD.Artist] = "Pet Chip Reader System"
-            exif_dict['0th'][piexif.ImageIFD.Copyright] = f"Chip ID: {metadata['detection']['chip_id']}"
+            ifd_0th = exif_dict['0th']
+            ifd_0th.update(self._exif_0th_template)
+            ifd_0th[ImageIFD.DateTime] = exif_datetime
+            ifd_0th[ImageIFD.Copyright] = f"Chip ID: {chip_id}"
             
             # Update EXIF IFD
-            exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal] = exif_datetime
-            exif_dict['Exif'][piexif.ExifIFD.DateTimeDigitized] = exif_datetime
+            exif_dict['Exif'][ExifIFD.DateTimeOriginal] = exif_datetime
+            exif_dict['Exif'][ExifIFD.DateTimeDigitized] = exif_datetime
             
             # Add custom description with AI analysis and chip info
-            description_parts = [
-                f"Pet Detection - Chip: {metadata['detection']['chip_id']}",
-                f"Camera: {metadata['image']['camera_id']}",
-                f"Date: {metadata['detection']['detection_date']} ({metadata['detection']['detection_day']})"
-            ]
-            
-            if 'ai_analysis' in metadata:
-                description_parts.append(f"AI: {metadata['ai_analysis']['description'][:100]}...")
-            
-            if 'location' in metadata:
-                description_parts.append(f"GPS: {metadata['location']['latitude']:.4f},{metadata['location']['longitude']:.4f}")
-            
-            exif_dict['0th'][piexif.ImageIFD.ImageDescription] = "; ".join(description_parts)
+            ai_part = f"; AI: {ai_analysis['description'][:100]}..." if ai_analysis else ""
+            gps_part = f"; GPS: {location['latitude']:.4f},{location['longitude']:.4f}" if location else ""
+            ifd_0th[ImageIFD.ImageDescription] = (
+                f"Pet Detection - Chip: {chip_id}; Camera: {metadata['image']['camera_id']}; "
+                f"Date: {detection['detection_date']} ({detection['detection_day']}){ai_part}{gps_part}"
+            )
             
             # Add GPS data if available
-            if 'location' in metadata:
-                self._embed_gps_data(exif_dict, metadata['location'])
+            if location:
+                self._embed_gps_data(exif_dict, location)
             
-            # Add user comment with full metadata (JSON format)
+            # Add user comment with full metadata (compressed JSON format)
             if self.metadata_quality == 'high':
-                metadata_json = json.dumps(metadata, default=str, indent=None)
-                # Encode as bytes for UserComment (direct UTF-8 encoding)
-                exif_dict['Exif'][piexif.ExifIFD.UserComment] = metadata_json.encode('utf-8')
+                payload = USER_COMMENT_PREFIX + zlib.compress(_json_bytes(metadata), 6)
+                if len(payload) <= USER_COMMENT_MAX_BYTES:
+                    exif_dict['Exif'][ExifIFD.UserComment] = payload
+                else:
+                    self.logger.warning(f"Metadata too large for EXIF UserComment ({len(payload)} bytes) - "
+                                        f"JSON sidecar only")
             
-            # Save image with updated EXIF
-            exif_bytes = piexif.dump(exif_dict)
-            img.save(image_path, exif=exif_bytes, quality=95)
+            # Splice updated EXIF into the file in place (no JPEG re-encode)
+            piexif.insert(piexif.dump(exif_dict), image_path)
             
             self.logger.debug(f"EXIF metadata embedded in {image_path}")
             return True
@@ -222,25 +407,21 @@ class ImageMetadataManager:
             
             # Convert decimal degrees to degrees/minutes/seconds format
             def decimal_to_dms(decimal_degrees):
-                degrees = int(abs(decimal_degrees))
-                minutes_float = (abs(decimal_degrees) - degrees) * 60
-                minutes = int(minutes_float)
-                seconds = (minutes_float - minutes) * 60
-                return [(degrees, 1), (minutes, 1), (int(seconds * 100), 100)]
+                degrees, minutes, centiseconds = _decimal_to_dms_kernel(float(decimal_degrees))
+                return [(degrees, 1), (minutes, 1), (centiseconds, 100)]
             
             # GPS data
             gps_data = {
-                piexif.GPSIFD.GPSVersionID: (2, 0, 0, 0),
-                piexif.GPSIFD.GPSLatitudeRef: 'N' if lat >= 0 else 'S',
-                piexif.GPSIFD.GPSLatitude: decimal_to_dms(lat),
-                piexif.GPSIFD.GPSLongitudeRef: 'E' if lon >= 0 else 'W',
-                piexif.GPSIFD.GPSLongitude: decimal_to_dms(lon),
-                piexif.GPSIFD.GPSMapDatum: 'WGS-84'
+                **self._gps_template,
+                GPSIFD.GPSLatitudeRef: 'N' if lat >= 0 else 'S',
+                GPSIFD.GPSLatitude: decimal_to_dms(lat),
+                GPSIFD.GPSLongitudeRef: 'E' if lon >= 0 else 'W',
+                GPSIFD.GPSLongitude: decimal_to_dms(lon)
             }
             
             if alt is not None:
-                gps_data[piexif.GPSIFD.GPSAltitudeRef] = 0  # Above sea level
-                gps_data[piexif.GPSIFD.GPSAltitude] = (int(alt * 100), 100)
+                gps_data[GPSIFD.GPSAltitudeRef] = 0  # Above sea level
+                gps_data[GPSIFD.GPSAltitude] = (int(alt * 100), 100)
             
             exif_dict['GPS'] = gps_data
             
@@ -261,11 +442,14 @@ class ImageMetadataManager:
         if not self.save_json_files:
             return False
         
+        if self.sidecar_format == 'parquet':
+            return self.save_metadata_parquet(image_path, metadata)
+        
         try:
             json_path = Path(image_path).with_suffix('.json')
             
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, default=str, ensure_ascii=False)
+            with open(json_path, 'wb') as f:
+                f.write(_json_bytes(metadata, indent=True))
             
             self.logger.debug(f"Metadata JSON saved: {json_path}")
             return True
@@ -274,6 +458,99 @@ class ImageMetadataManager:
             self.logger.error(f"Failed to save metadata JSON: {e}")
             return False
     
+    def save_metadata_parquet(self, image_path: str, metadata: Dict[str, Any]) -> bool:
+        """
+        Buffer metadata as one row of a per-day Parquet dataset
+        
+        Rows are written to metadata_<date>_<time>.parquet files in the image
+        directory. Each file is complete when it appears: the buffer is flushed as
+        one row group every PARQUET_FLUSH_ROWS rows, PARQUET_FLUSH_SECONDS after
+        the first buffered row, on a directory/day change, and on close(). The full
+        metadata is kept in the metadata_json column alongside flat columns.
+        
+        Args:
+            image_path: Path to the image file
+            metadata: Metadata dictionary to save
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            row = _metadata_row(metadata)
+            directory = Path(image_path).parent
+            day = metadata.get('detection', {}).get('detection_date') or datetime.now().strftime('%Y-%m-%d')
+            
+            with self._parquet_lock:
+                if self._parquet_key != (directory, day):
+                    self._flush_parquet()
+                    self._parquet_key = (directory, day)
+                self._parquet_rows.append(row)
+                self._register_close()
+                
+                if len(self._parquet_rows) >= PARQUET_FLUSH_ROWS:
+                    self._flush_parquet()
+                elif self._parquet_timer is None:
+                    self._parquet_timer = threading.Timer(PARQUET_FLUSH_SECONDS, self.flush_parquet)
+                    self._parquet_timer.daemon = True
+                    self._parquet_timer.start()
+            
+            self.logger.debug(f"Metadata row buffered for {Path(image_path).name}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Failed to save metadata Parquet row: {e}")
+            return False
+    
+    def flush_parquet(self):
+        """Write any buffered Parquet sidecar rows to disk"""
+        with self._parquet_lock:
+            self._flush_parquet()
+    
+    def _flush_parquet(self):
+        """Write buffered rows as one finished Parquet file (caller holds the lock)"""
+        if self._parquet_timer is not None:
+            self._parquet_timer.cancel()
+            self._parquet_timer = None
+        if not self._parquet_rows:
+            return
+            
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            
+            if self._parquet_schema is None:
+                self._parquet_schema = pa.schema([
+                    ('chip_id', pa.string()),
+                    ('camera_id', pa.int64()),
+                    ('detection_time', pa.string()),
+                    ('filename', pa.string()),
+                    ('path', pa.string()),
+                    ('width', pa.int64()),
+                    ('height', pa.int64()),
+                    ('file_size', pa.int64()),
+                    ('latitude', pa.float64()),
+                    ('longitude', pa.float64()),
+                    ('altitude', pa.float64()),
+                    ('ai_description', pa.string()),
+                    ('metadata_json', pa.string())
+                ])
+            
+            directory, day = self._parquet_key
+            table = pa.Table.from_pylist(self._parquet_rows, schema=self._parquet_schema)
+            parquet_path = directory / f"metadata_{day}_{datetime.now().strftime('%H%M%S%f')}.parquet"
+            
+            # Write under a temporary name so a power cut never leaves a truncated .parquet
+            tmp_path = parquet_path.with_suffix('.parquet.tmp')
+            pq.write_table(table, str(tmp_path))
+            os.replace(tmp_path, parquet_path)
+            
+            self.logger.info(f"Parquet metadata sidecar written: {parquet_path} ({len(self._parquet_rows)} rows)")
+            self._parquet_rows.clear()
+            
+        except Exception as e:
+            # Rows stay buffered for the next flush
+            self.logger.error(f"Failed to write Parquet metadata file: {e}")
+    
     def process_image_metadata(self, 
                              image_path: str,
                              chip_id: str,
@@ -288,6 +565,9 @@ class ImageMetadataManager:
         Creates comprehensive metadata and embeds it into the image file
         """
         try:
+            # Read image properties and existing EXIF once for the whole pipeline
+            image_info, exif_bytes = self._read_image_header(image_path)
+            
             # Create comprehensive metadata
             metadata = self.create_comprehensive_metadata(
                 image_path=image_path,
@@ -296,11 +576,12 @@ class ImageMetadataManager:
                 gps_coordinates=gps_coordinates,
                 ai_description=ai_description,
                 detection_time=detection_time,
-                additional_info=additional_info
+                additional_info=additional_info,
+                image_info=image_info
             )
             
             # Embed EXIF metadata
-            exif_success = self.embed_exif_metadata(image_path, metadata)
+            exif_success = self.embed_exif_metadata(image_path, metadata, exif_bytes)
             
             # Save JSON metadata
             json_success = self.save_metadata_json(image_path, metadata)
@@ -316,6 +597,38 @@ class ImageMetadataManager:
             self.logger.error(f"Failed to process image metadata: {e}")
             return {}
     
+    def process_image_metadata_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run process_image_metadata for several images concurrently
+        
+        Args:
+            items: List of keyword-argument dicts for process_image_metadata
+            
+        Returns:
+            List of metadata dictionaries in the same order as items
+        """
+        if len(items) == 1:
+            return [self.process_image_metadata(**items[0])]
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='metadata')
+                self._register_close()
+        return list(self._pool.map(lambda item: self.process_image_metadata(**item), items))
+    
+    def _register_close(self):
+        """Run close() at interpreter exit once there is a pool or buffered sidecar to finish"""
+        if not self._close_registered:
+            self._close_registered = True
+            atexit.register(self.close)
+    
+    def close(self):
+        """Shut down the metadata worker pool and finalize any Parquet sidecar"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+        self.flush_parquet()
+    
     def read_image_metadata(self, image_path: str) -> Dict[str, Any]:
         """
         Read metadata from an image file
@@ -336,22 +649,23 @@ class ImageMetadataManager:
                 self.logger.debug(f"Could not read JSON metadata: {e}")
         
         # Fallback to EXIF data
-        if EXIF_AVAILABLE:
+        if _load_exif_libs():
             try:
-                with Image.open(image_path) as img:
-                    exif_data = piexif.load(img.info.get('exif', b''))
-                    
-                    # Extract basic metadata
-                    if 'Exif' in exif_data and piexif.ExifIFD.UserComment in exif_data['Exif']:
-                        try:
-                            user_comment_bytes = exif_data['Exif'][piexif.ExifIFD.UserComment]
-                            user_comment = user_comment_bytes.decode('utf-8')
-                            metadata = json.loads(user_comment)
-                        except:
-                            pass
-                    
-                    self.logger.debug(f"Loaded metadata from EXIF: {image_path}")
-                    
+                # piexif reads only the APP1 segment - no PIL decoder needed
+                exif_data = piexif.load(image_path)
+                
+                # Extract basic metadata
+                if 'Exif' in exif_data and ExifIFD.UserComment in exif_data['Exif']:
+                    try:
+                        user_comment_bytes = exif_data['Exif'][ExifIFD.UserComment]
+                        if user_comment_bytes.startswith(USER_COMMENT_PREFIX):
+                            user_comment_bytes = zlib.decompress(user_comment_bytes[len(USER_COMMENT_PREFIX):])
+                        metadata = json.loads(user_comment_bytes.decode('utf-8'))
+                    except:
+                        pass
+                
+                self.logger.debug(f"Loaded metadata from EXIF: {image_path}")
+                
             except Exception as e:
                 self.logger.debug(f"Could not read EXIF metadata: {e}")
         
@@ -359,50 +673,50 @@ class ImageMetadataManager:
     
     def extract_gps_from_exif(self, image_path: str) -> Optional[Tuple[float, float, Optional[float]]]:
         """Extract GPS coordinates from image EXIF data"""
-        if not EXIF_AVAILABLE:
+        if not _load_exif_libs():
             return None
         
         try:
-            with Image.open(image_path) as img:
-                exif_data = piexif.load(img.info.get('exif', b''))
-                
-                if 'GPS' not in exif_data:
-                    return None
-                
-                gps_data = exif_data['GPS']
-                
-                # Extract latitude
-                if piexif.GPSIFD.GPSLatitude in gps_data and piexif.GPSIFD.GPSLatitudeRef in gps_data:
-                    lat_dms = gps_data[piexif.GPSIFD.GPSLatitude]
-                    lat_ref = gps_data[piexif.GPSIFD.GPSLatitudeRef].decode('ascii')
-                    lat = self._dms_to_decimal(lat_dms)
-                    if lat_ref == 'S':
-                        lat = -lat
-                else:
-                    return None
-                
-                # Extract longitude
-                if piexif.GPSIFD.GPSLongitude in gps_data and piexif.GPSIFD.GPSLongitudeRef in gps_data:
-                    lon_dms = gps_data[piexif.GPSIFD.GPSLongitude]
-                    lon_ref = gps_data[piexif.GPSIFD.GPSLongitudeRef].decode('ascii')
-                    lon = self._dms_to_decimal(lon_dms)
-                    if lon_ref == 'W':
-                        lon = -lon
-                else:
-                    return None
-                
-                # Extract altitude (optional)
-                alt = None
-                if piexif.GPSIFD.GPSAltitude in gps_data:
-                    alt_data = gps_data[piexif.GPSIFD.GPSAltitude]
-                    alt = alt_data[0] / alt_data[1]  # Convert from fraction
-                    
-                    if (piexif.GPSIFD.GPSAltitudeRef in gps_data and 
-                        gps_data[piexif.GPSIFD.GPSAltitudeRef] == 1):
-                        alt = -alt  # Below sea level
-                
-                return (lat, lon, alt)
+            # piexif reads only the APP1 segment - no PIL decoder needed
+            exif_data = piexif.load(image_path)
+            
+            if 'GPS' not in exif_data:
+                return None
+            
+            gps_data = exif_data['GPS']
+            
+            # Extract latitude
+            if GPSIFD.GPSLatitude in gps_data and GPSIFD.GPSLatitudeRef in gps_data:
+                lat_dms = gps_data[GPSIFD.GPSLatitude]
+                lat_ref = gps_data[GPSIFD.GPSLatitudeRef].decode('ascii')
+                lat = self._dms_to_decimal(lat_dms)
+                if lat_ref == 'S':
+                    lat = -lat
+            else:
+                return None
+            
+            # Extract longitude
+            if GPSIFD.GPSLongitude in gps_data and GPSIFD.GPSLongitudeRef in gps_data:
+                lon_dms = gps_data[GPSIFD.GPSLongitude]
+                lon_ref = gps_data[GPSIFD.GPSLongitudeRef].decode('ascii')
+                lon = self._dms_to_decimal(lon_dms)
+                if lon_ref == 'W':
+                    lon = -lon
+            else:
+                return None
+            
+            # Extract altitude (optional)
+            alt = None
+            if GPSIFD.GPSAltitude in gps_data:
+                alt_data = gps_data[GPSIFD.GPSAltitude]
+                alt = alt_data[0] / alt_data[1]  # Convert from fraction
                 
+                if (GPSIFD.GPSAltitudeRef in gps_data and 
+                    gps_data[GPSIFD.GPSAltitudeRef] == 1):
+                    alt = -alt  # Below sea level
+            
+            return (lat, lon, alt)
+            
         except Exception as e:
             self.logger.debug(f"Could not extract GPS from EXIF: {e}")
             return None
@@ -410,10 +724,9 @@ class ImageMetadataManager:
     def _dms_to_decimal(self, dms_tuple):
         """Convert degrees/minutes/seconds to decimal degrees"""
         degrees, minutes, seconds = dms_tuple
-        decimal = degrees[0] / degrees[1]
-        decimal += (minutes[0] / minutes[1]) / 60
-        decimal += (seconds[0] / seconds[1]) / 3600
-        return decimal
+        return _dms_to_decimal_kernel(degrees[0], degrees[1],
+                                      minutes[0], minutes[1],
+                                      seconds[0], seconds[1])
 
 
 def test_metadata_manager():
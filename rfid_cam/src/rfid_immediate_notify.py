@@ -5,16 +5,24 @@ Simplified version that sends SMS notification for every detection
 """
 
 import os
+import io
+import re
 import sys
+import json
+import mmap
 import time
 import serial
 import signal
+import queue
 import logging
+import logging.handlers
+import threading
 import smtplib
 import subprocess
 import base64
+import secrets
 import requests
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText as MimeText
 from email.mime.multipart import MIMEMultipart as MimeMultipart
 from collections import defaultdict, deque
@@ -28,6 +36,24 @@ except ImportError:
     CAMERA_AVAILABLE = False
     print("Warning: picamera2 not available")
 
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 15-digit FDX-B tag ID, matched directly on the raw serial bytes
+FDXB_PATTERN = re.compile(rb'(\d{15})')
+
+# How long encounter history is kept, in seconds
+ENCOUNTER_HISTORY_SECONDS = 7 * 24 * 3600
+
+# Detections between sweeps of the dedupe and encounter-history dicts
+SWEEP_INTERVAL = 256
+
+# Stand-in for the image data URL, replaced after the AI request body is serialized
+IMAGE_URL_PLACEHOLDER = '__IMAGE_URL__'
+
 class RFIDCameraSystem:
     def __init__(self):
         """Initialize the RFID Camera System"""
@@ -39,10 +65,16 @@ class RFIDCameraSystem:
             'serial_port': os.getenv('SERIAL_PORT', '/dev/ttyUSB1'),
             'baud_rate': int(os.getenv('BAUD_RATE', '9600')),
             'poll_interval': float(os.getenv('POLL_INTERVAL', '0.5')),
+            'serial_low_latency': os.getenv('SERIAL_LOW_LATENCY', 'true').lower() == 'true',
             'dedupe_seconds': int(os.getenv('DEDUPE_SECONDS', '5')),
+            'debounce_reads': int(os.getenv('DEBOUNCE_READS', '2')),
+            'detection_queue_size': int(os.getenv('DETECTION_QUEUE_SIZE', '8')),
             'photo_dir': os.getenv('PHOTO_DIR', '/home/collins/rfid_photos'),
             'rclone_remote': os.getenv('RCLONE_REMOTE', 'gdrive'),
             'rclone_path': os.getenv('RCLONE_PATH', 'pet-photos'),
+            'upload_concurrency': int(os.getenv('UPLOAD_CONCURRENCY', '8')),
+            'rclone_rcd': os.getenv('RCLONE_RCD', 'true').lower() == 'true',
+            'rclone_rc_addr': os.getenv('RCLONE_RC_ADDR', '127.0.0.1:5572'),
             'poll_address': os.getenv('POLL_ADDRESS', '01'),
             'poll_format': os.getenv('POLL_FORMAT', 'D'),
             'lost_tag': os.getenv('LOST_TAG', ''),
@@ -52,17 +84,43 @@ class RFIDCameraSystem:
             'smtp_username': os.getenv('SMTP_USER'),
             'smtp_password': os.getenv('SMTP_PASS'),
             'notification_email': os.getenv('ALERT_TO_EMAIL'),
+            'notify_coalesce_seconds': float(os.getenv('NOTIFY_COALESCE_SECONDS', '3')),
             'openai_api_key': os.getenv('OPENAI_API_KEY'),
+            'ai_image_max_size': int(os.getenv('AI_IMAGE_MAX_SIZE', '768')),
         }
         
         # State tracking
+        self._candidate_tag = None
+        self._candidate_count = 0
         self.last_tag_time = {}
+        self._dedupe = float(self.config['dedupe_seconds'])
         self.last_notification_time = {}
         self.encounter_history = defaultdict(deque)
+        self._dedupe_sweep_ctr = 0
+        self._history_sweep_ctr = 0
         
         # Hardware components
         self.serial_conn = None
         self.camera = None
+        self._poll_cmd = None
+        
+        # Detection worker (capture/AI/upload/notify off the poll thread)
+        self._work_q = None
+        self._work_thread = None
+        
+        # Upload worker pool and rclone rc daemon (created in initialize_hardware)
+        self._upload_pool = None
+        self._rclone_proc = None
+        self._rc = None
+        self._rc_url = None
+        
+        # Keep-alive HTTP session for OpenAI requests
+        self._http = None
+        
+        # Background notification sender
+        self._mail_q = None
+        self._mail_thread = None
+        self._notification_templates = None
         
         # Setup logging
         self.setup_logging()
@@ -79,16 +137,23 @@ class RFIDCameraSystem:
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(logging.Formatter(log_format))
         
-        # Configure logger
+        # Configure logger - records are queued and written by a listener thread
+        # so log calls on the detection path never wait on the SD card
+        log_queue = queue.Queue(-1)
+        self._log_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+        self._log_listener.start()
+        
         self.logger = logging.getLogger()
         self.logger.setLevel(logging.INFO)
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
         
     def initialize_hardware(self):
         """Initialize camera and serial connection"""
         self.logger.info("Initializing system components...")
         
+        # Ensure photo directory exists
+        os.makedirs(self.config['photo_dir'], exist_ok=True)
+        
         # Initialize camera
         if CAMERA_AVAILABLE:
             try:
@@ -100,7 +165,7 @@ class RFIDCameraSystem:
                 self.camera.configure(config)
                 self.camera.set_controls({"AfMode": controls.AfModeEnum.Continuous})
                 self.camera.start()
-                time.sleep(2)  # Allow camera to stabilize
+                self.camera.capture_metadata()  # Wait for the first frame, not a fixed delay
                 self.logger.info("Camera initialized successfully (single camera mode)")
             except Exception as e:
                 self.logger.error(f"Camera initialization failed: {e}")
@@ -111,23 +176,115 @@ class RFIDCameraSystem:
             self.serial_conn = serial.Serial(
                 port=self.config['serial_port'],
                 baudrate=self.config['baud_rate'],
-                timeout=1
+                timeout=self.config['poll_interval']  # Bounds each poll when the reader is silent
             )
             self.logger.info(f"Serial connection established on {self.config['serial_port']} at {self.config['baud_rate']} baud")
+            
+            if self.config['serial_low_latency']:
+                self._enable_low_latency()
+            
+            # Address and format are fixed for the run, so build the poll frame once
+            self._poll_cmd = self.create_poll_command()
         except Exception as e:
             self.logger.error(f"Serial connection failed: {e}")
             raise
             
-        # Initialize email notifications
+        # Bounded detection queue drained by a worker so polling never stalls
+        self._work_q = queue.Queue(maxsize=self.config['detection_queue_size'])
+        self._work_thread = threading.Thread(target=self._detection_worker, daemon=True)
+        self._work_thread.start()
+        
+        # Persistent pool for parallel rclone uploads
+        self._upload_pool = ThreadPoolExecutor(max_workers=self.config['upload_concurrency'],
+                                               thread_name_prefix='upload')
+        self._start_rclone_daemon()
+        
+        # Reuse one connection to the OpenAI API across detections
+        if self.config['openai_api_key']:
+            self._http = requests.Session()
+            self._http.headers.update({
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.config['openai_api_key']}"
+            })
+        
+        # Initialize email notifications (sent from a background worker)
         if self.config['smtp_server']:
+            self._notification_templates = self._build_notification_templates()
+            self._mail_q = queue.Queue()
+            self._mail_thread = threading.Thread(target=self._mail_worker, daemon=True)
+            self._mail_thread.start()
             self.logger.info("Email notifications configured")
         
+    def _enable_low_latency(self):
+        """Set ASYNC_LOW_LATENCY on the USB-serial port to skip the driver's latency timer"""
+        # pyserial issues TIOCGSERIAL/TIOCSSERIAL for us on Linux; FTDI-class adapters
+        # otherwise batch replies for up to 16 ms before read() sees them
+        try:
+            self.serial_conn.set_low_latency_mode(True)
+            self.logger.info("Serial low-latency mode enabled")
+        except (AttributeError, OSError, ValueError) as e:
+            self.logger.debug(f"Serial low-latency mode not supported on this port: {e}")
+            
+    def _start_rclone_daemon(self):
+        """Start a long-lived rclone rc daemon so uploads skip per-file rclone launches"""
+        if not self.config['rclone_rcd'] or not self.config['rclone_remote']:
+            return
+            
+        # Random per-run credentials, passed via environment to keep them out of ps
+        user, password = 'rfid_cam', secrets.token_urlsafe(16)
+        env = dict(os.environ, RCLONE_RC_USER=user, RCLONE_RC_PASS=password)
+        try:
+            self._rclone_proc = subprocess.Popen(
+                ['rclone', 'rcd', f"--rc-addr={self.config['rclone_rc_addr']}"],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except Exception as e:
+            self.logger.warning(f"Could not start rclone rc daemon, using rclone CLI: {e}")
+            return
+            
+        session = requests.Session()
+        session.auth = (user, password)
+        url = f"http://{self.config['rclone_rc_addr']}/"
+        
+        # Wait for the daemon to accept requests
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and self._rclone_proc.poll() is None:
+            try:
+                session.post(url + 'rc/noop', json={}, timeout=1).raise_for_status()
+                self._rc = session
+                self._rc_url = url
+                self.logger.info(f"rclone rc daemon ready on {self.config['rclone_rc_addr']}")
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+                
+        self.logger.warning("rclone rc daemon not responding, using rclone CLI")
+        self._stop_rclone_daemon()
+        
+    def _stop_rclone_daemon(self):
+        """Stop the rclone rc daemon if running"""
+        self._rc = None
+        if self._rclone_proc and self._rclone_proc.poll() is None:
+            self._rclone_proc.terminate()
+            try:
+                self._rclone_proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._rclone_proc.kill()
+        self._rclone_proc = None
+        
     def calculate_bcc(self, data_without_bcc):
         """Calculate BCC (XOR checksum) for RBC-A04 protocol"""
-        bcc = 0
-        for byte in data_without_bcc:
-            bcc ^= byte
-        return bcc
+        # XOR 8 bytes at a time as one integer, then fold the word down to a byte
+        data = data_without_bcc
+        n = len(data)
+        x = 0
+        for i in range(0, n - 7, 8):
+            x ^= int.from_bytes(data[i:i + 8], 'little')
+        x ^= int.from_bytes(data[n & ~7:], 'little')
+        x = (x >> 32) ^ (x & 0xFFFFFFFF)
+        x = (x >> 16) ^ (x & 0xFFFF)
+        x = (x >> 8) ^ (x & 0xFF)
+        return x
         
     def create_poll_command(self):
         """Create polling command for RBC-A04"""
@@ -149,19 +306,31 @@ class RFIDCameraSystem:
             
         try:
             # Send polling command
-            command = self.create_poll_command()
-            self.serial_conn.write(command)
+            self.serial_conn.write(self._poll_cmd)
             
-            # Read response
-            response = self.serial_conn.read(50)
+            # Read response - returns as soon as the frame terminator arrives
+            response = self.serial_conn.read_until(b'#', 64)
             if response:
-                response_str = response.decode('ascii', errors='ignore')
-                
+                # Validate the $<data><BCC># frame so a corrupted read can't trigger
+                # the capture/AI/notification pipeline
+                start = response.rfind(b'$')
+                if start == -1 or not response.endswith(b'#') or len(response) - start < 5:
+                    return None
+                    
+                # Checksum and tag search work on a view of the frame rather than copies
+                data = memoryview(response)[start + 1:-3]
+                try:
+                    bcc_received = int(response[-3:-1], 16)
+                except ValueError:
+                    return None
+                if self.calculate_bcc(data) != bcc_received:
+                    self.logger.warning(f"BCC mismatch on reader response: {response!r}")
+                    return None
+                    
                 # Extract tag ID using regex for 15-digit FDX-B format
-                import re
-                match = re.search(r'(\d{15})', response_str)
+                match = FDXB_PATTERN.search(data)
                 if match:
-                    return match.group(1)
+                    return match.group(1).decode('ascii')
                     
         except Exception as e:
             self.logger.error(f"Serial communication error: {e}")
@@ -169,83 +338,132 @@ class RFIDCameraSystem:
             
         return None
         
-    def capture_photo(self, tag_id):
-        """Capture photo when tag is detected"""
+    def capture_photo(self, tag_id, timestamp=None):
+        """Capture a JPEG into memory; returns (filepath, jpeg_bytes), or (None, None) on failure"""
         if not self.camera:
             self.logger.warning("No camera available for photo capture")
-            return []
+            return None, None
             
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        photo_paths = []
-        
-        try:
-            # Ensure photo directory exists
-            os.makedirs(self.config['photo_dir'], exist_ok=True)
+        if timestamp is None:
+            timestamp = time.strftime('%Y%m%d_%H%M%S')
             
-            # Capture photo
+        try:
             filename = f"{timestamp}_{tag_id}_cam0.jpg"
             filepath = os.path.join(self.config['photo_dir'], filename)
             
-            self.camera.capture_file(filepath)
-            photo_paths.append(filepath)
-            self.logger.info(f"Photo saved: {filepath}")
+            # Encode in memory so AI analysis doesn't wait on the SD card
+            buffer = io.BytesIO()
+            self.camera.capture_file(buffer, format='jpeg')
+            self.logger.info(f"Photo captured: {filename}")
+            return filepath, buffer.getvalue()
             
         except Exception as e:
             self.logger.error(f"Photo capture failed: {e}")
             
-        return photo_paths
+        return None, None
+        
+    def save_photo(self, filepath, jpeg_bytes):
+        """Write a captured JPEG to disk, returning True on success"""
+        try:
+            # Write then rename so a partial file is never uploaded; no fsync,
+            # so the SD card isn't forced to flush mid-detection
+            tmp_path = filepath + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(jpeg_bytes)
+            os.replace(tmp_path, filepath)
+            self.logger.info(f"Photo saved: {filepath}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Photo save failed: {e}")
+            return False
         
     def upload_photos(self, photo_paths):
-        """Upload photos to cloud storage using rclone"""
-        photo_links = []
+        """Upload photos to cloud storage using rclone (in parallel)"""
+        if self._upload_pool is None:
+            links = map(self._upload_one, photo_paths)
+        else:
+            links = self._upload_pool.map(self._upload_one, photo_paths)
+        return [link for link in links if link]
         
-        for photo_path in photo_paths:
-            try:
-                filename = os.path.basename(photo_path)
-                remote_path = f"{self.config['rclone_remote']}:{self.config['rclone_path']}/{filename}"
+    def _upload_one(self, photo_path):
+        """Upload a single photo and return its share link (or None)"""
+        if self._rc is not None:
+            return self._upload_one_rc(photo_path)
+            
+        try:
+            filename = os.path.basename(photo_path)
+            remote_path = f"{self.config['rclone_remote']}:{self.config['rclone_path']}/{filename}"
+            
+            # Upload using rclone
+            result = subprocess.run([
+                'rclone', 'copy', photo_path, f"{self.config['rclone_remote']}:{self.config['rclone_path']}"
+            ], capture_output=True, text=True, timeout=30)
+            
+            if result.returncode == 0:
+                self.logger.info(f"Upload successful: {filename}")
                 
-                # Upload using rclone
-                result = subprocess.run([
-                    'rclone', 'copy', photo_path, f"{self.config['rclone_remote']}:{self.config['rclone_path']}"
-                ], capture_output=True, text=True, timeout=30)
+                # Generate share link
+                link_result = subprocess.run([
+                    'rclone', 'link', remote_path
+                ], capture_output=True, text=True, timeout=10)
                 
-                if result.returncode == 0:
-                    self.logger.info(f"Upload successful: {filename}")
-                    
-                    # Generate share link
-                    link_result = subprocess.run([
-                        'rclone', 'link', remote_path
-                    ], capture_output=True, text=True, timeout=10)
-                    
-                    if link_result.returncode == 0:
-                        link = link_result.stdout.strip()
-                        photo_links.append(link)
-                        self.logger.info(f"Photo link: {link}")
-                    else:
-                        self.logger.warning(f"Link generation failed for {filename}")
-                        
+                if link_result.returncode == 0:
+                    link = link_result.stdout.strip()
+                    self.logger.info(f"Photo link: {link}")
+                    return link
                 else:
-                    self.logger.error(f"Upload failed for {filename}: {result.stderr}")
+                    self.logger.warning(f"Link generation failed for {filename}")
                     
-            except Exception as e:
-                self.logger.error(f"Upload error for {photo_path}: {e}")
+            else:
+                self.logger.error(f"Upload failed for {filename}: {result.stderr}")
                 
-        return photo_links
+        except Exception as e:
+            self.logger.error(f"Upload error for {photo_path}: {e}")
+            
+        return None
+        
+    def _upload_one_rc(self, photo_path):
+        """Upload a single photo through the rclone rc daemon and return its share link"""
+        filename = os.path.basename(photo_path)
+        remote_fs = f"{self.config['rclone_remote']}:"
+        remote_path = f"{self.config['rclone_path']}/{filename}"
+        
+        try:
+            result = self._rc.post(self._rc_url + 'operations/copyfile', json={
+                'srcFs': os.path.dirname(os.path.abspath(photo_path)),
+                'srcRemote': filename,
+                'dstFs': remote_fs,
+                'dstRemote': remote_path
+            }, timeout=30)
+            if not result.ok:
+                self.logger.error(f"Upload failed for {filename}: {result.text}")
+                return None
+            self.logger.info(f"Upload successful: {filename}")
+            
+            # Generate share link
+            link_result = self._rc.post(self._rc_url + 'operations/publiclink', json={
+                'fs': remote_fs,
+                'remote': remote_path
+            }, timeout=10)
+            if link_result.ok and link_result.json().get('url'):
+                link = link_result.json()['url']
+                self.logger.info(f"Photo link: {link}")
+                return link
+            self.logger.warning(f"Link generation failed for {filename}")
+            
+        except Exception as e:
+            self.logger.error(f"Upload error for {photo_path}: {e}")
+            
+        return None
         
-    def analyze_animal_with_ai(self, image_path):
-        """Analyze animal in photo using OpenAI Vision API"""
-        if not self.config['openai_api_key']:
+    def analyze_animal_with_ai(self, image):
+        """Analyze animal in photo (file path or JPEG bytes) using OpenAI Vision API"""
+        if not self._http:
             return "animal (AI analysis not configured)"
             
         try:
-            # Read and encode the image
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.config['openai_api_key']}"
-            }
+            # Read, downscale and encode the image (base64 bytes)
+            base64_image = self._encode_image_for_ai(image)
             
             payload = {
                 "model": "gpt-4o",
@@ -260,7 +478,8 @@ class RFIDCameraSystem:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": IMAGE_URL_PLACEHOLDER,
+                                    "detail": "low"
                                 }
                             }
                         ]
@@ -269,8 +488,14 @@ class RFIDCameraSystem:
                 "max_tokens": 150
             }
             
-            response = requests.post("https://api.openai.com/v1/chat/completions", 
-                                   headers=headers, json=payload, timeout=30)
+            # Splice the base64 bytes into the serialized body rather than
+            # building str copies of the image inside the payload dict
+            head, tail = json.dumps(payload).encode('ascii').split(IMAGE_URL_PLACEHOLDER.encode('ascii'))
+            body = b''.join((head, b'data:image/jpeg;base64,', base64_image, tail))
+            del base64_image
+            
+            response = self._http.post("https://api.openai.com/v1/chat/completions",
+                                       data=body, timeout=30)
             response.raise_for_status()
             
             result = response.json()
@@ -287,55 +512,158 @@ class RFIDCameraSystem:
             self.logger.error(f"AI analysis failed: {e}")
             return "animal (AI analysis error)"
         
-    def send_notification(self, tag_id, photo_links, animal_description=None):
+    def _encode_image_for_ai(self, image):
+        """Base64-encode a photo for the AI request, downscaled to keep the payload small"""
+        max_size = self.config['ai_image_max_size']
+        in_memory = isinstance(image, (bytes, bytearray))
+        if PIL_AVAILABLE:
+            try:
+                with Image.open(io.BytesIO(image) if in_memory else image) as img:
+                    img.draft('RGB', (max_size, max_size))  # Let libjpeg decode at reduced scale
+                    img.thumbnail((max_size, max_size))
+                    buffer = io.BytesIO()
+                    img.convert('RGB').save(buffer, 'JPEG', quality=80)
+                return base64.b64encode(buffer.getbuffer())
+            except Exception as e:
+                self.logger.warning(f"Image downscale failed, sending original: {e}")
+                
+        if in_memory:
+            return base64.b64encode(image)
+            
+        # Encode straight from the page cache without reading the file into memory
+        with open(image, "rb") as image_file, \
+                mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return base64.b64encode(mm)
+            
+    def _build_notification_templates(self):
+        """Precompute message templates keyed by (has_desc, has_link, is_lost)"""
+        templates = {}
+        for has_desc in (False, True):
+            for has_link in (False, True):
+                for is_lost in (False, True):
+                    if has_desc:
+                        text = "🐾 {desc} detected at {t}!\n\nChip: {tag}"
+                    else:
+                        text = "Pet detected at {t}! Chip: {tag}"
+                    if has_link:
+                        text += "\n\nPhoto: {link}"
+                    # Special handling for lost pet
+                    if is_lost:
+                        text = "🚨 LOST PET FOUND! " + text
+                    templates[(has_desc, has_link, is_lost)] = text
+        return templates
+        
+    def send_notification(self, tag_id, photo_links, animal_description=None, detected_at=None):
         """Send immediate SMS/email notification with AI analysis"""
         if not self.config['smtp_server']:
             return
             
         try:
             # Create message with AI description
-            now = datetime.now()
-            if animal_description:
-                message_text = f"🐾 {animal_description} detected at {now.strftime('%I:%M %p')}!\n\nChip: {tag_id}"
-            else:
-                message_text = f"Pet detected at {now.strftime('%I:%M %p')}! Chip: {tag_id}"
+            key = (bool(animal_description), bool(photo_links), tag_id == self.config['lost_tag'])
+            message_text = self._notification_templates[key].format(
+                desc=animal_description,
+                t=time.strftime('%I:%M %p', time.localtime(detected_at)),
+                tag=tag_id,
+                link=photo_links[0] if photo_links else None
+            )
             
-            if photo_links:
-                message_text += f"\n\nPhoto: {photo_links[0]}"
-                
-            # Special handling for lost pet
-            if tag_id == self.config['lost_tag']:
-                message_text = f"🚨 LOST PET FOUND! {message_text}"
+            # Hand off to the mail worker so the detection path never waits on SMTP
+            self._mail_q.put(message_text)
+            self.logger.info("SMS notification queued")
+            
+        except Exception as e:
+            self.logger.error(f"Notification failed: {e}")
+            
+    def _next_mail_batch(self):
+        """Wait for a notification, then collect any others queued within the coalesce window"""
+        first = self._mail_q.get()
+        if first is None:
+            return [], True
+            
+        batch = [first]
+        deadline = time.monotonic() + self.config['notify_coalesce_seconds']
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                message_text = self._mail_q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if message_text is None:  # Send what we have, then stop
+                return batch, True
+            batch.append(message_text)
+        return batch, False
+        
+    def _mail_worker(self):
+        """Send queued notifications over a persistent SMTP connection"""
+        server = None
+        stopping = False
+        
+        while not stopping:
+            batch, stopping = self._next_mail_batch()
+            if not batch:
+                break
                 
-            # Send via SMTP (SMS gateway)
+            # One message per burst of detections
             msg = MimeMultipart()
             msg['From'] = self.config['smtp_username']
             msg['To'] = self.config['notification_email']
             msg['Subject'] = ""  # Empty subject for SMS
+            msg.attach(MimeText("\n---\n".join(batch), 'plain'))
             
-            msg.attach(MimeText(message_text, 'plain'))
-            
-            with smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_username'], self.config['smtp_password'])
-                server.send_message(msg)
-                
-            self.logger.info("SMS notification sent successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Notification failed: {e}")
-            
+            # One retry with a fresh connection if the kept-alive one has dropped
+            for attempt in range(2):
+                try:
+                    if server is None:
+                        server = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=30)
+                        server.starttls()
+                        server.login(self.config['smtp_username'], self.config['smtp_password'])
+                    server.send_message(msg)
+                    self.logger.info(f"SMS notification sent successfully ({len(batch)} detection(s))")
+                    break
+                except Exception as e:
+                    if server is not None:
+                        try:
+                            server.close()
+                        except Exception:
+                            pass
+                        server = None
+                    if attempt:
+                        self.logger.error(f"Notification failed: {e}")
+                        
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+            
+    def is_stable_read(self, tag_id):
+        """Require the same tag in consecutive polls before acting on it"""
+        if tag_id != self._candidate_tag:
+            self._candidate_tag = tag_id
+            self._candidate_count = 0
+        if tag_id is None:
+            return False
+            
+        self._candidate_count += 1
+        return self._candidate_count >= self.config['debounce_reads']
+        
     def should_process_tag(self, tag_id):
         """Check if we should process this tag detection"""
-        now = time.time()
+        # Monotonic so an NTP step can't reopen the dedupe window
+        now = time.monotonic()
         
         # Check deduplication
-        if tag_id in self.last_tag_time:
-            time_diff = now - self.last_tag_time[tag_id]
-            if time_diff < self.config['dedupe_seconds']:
-                return False
-                
+        last = self.last_tag_time.get(tag_id)
+        if last is not None and now - last < self._dedupe:
+            return False
+            
         self.last_tag_time[tag_id] = now
+        
+        # Periodically forget tags whose dedupe window has passed
+        self._dedupe_sweep_ctr += 1
+        if self._dedupe_sweep_ctr % SWEEP_INTERVAL == 0:
+            cutoff = now - self._dedupe
+            self.last_tag_time = {k: v for k, v in self.last_tag_time.items() if v > cutoff}
         return True
         
     def process_tag_detection(self, tag_id):
@@ -343,38 +671,92 @@ class RFIDCameraSystem:
         try:
             self.logger.info(f"Tag detected: {tag_id}")
             
-            # Capture photos
-            photo_paths = self.capture_photo(tag_id)
+            # One timestamp shared by the photo filename, notification and history
+            now = time.time()
+            local_now = time.localtime(now)
             
-            # Analyze animal with AI if photo was captured
-            animal_description = None
-            if photo_paths:
+            # Capture photo into memory
+            filepath, jpeg_bytes = self.capture_photo(tag_id, time.strftime('%Y%m%d_%H%M%S', local_now))
+            
+            # Analyze animal with AI in the background while the photo is saved and uploaded
+            ai_future = None
+            photo_paths = []
+            if jpeg_bytes:
+                saved = self._upload_pool.submit(self.save_photo, filepath, jpeg_bytes)
                 self.logger.info("Analyzing photo with AI...")
-                animal_description = self.analyze_animal_with_ai(photo_paths[0])
+                ai_future = self._upload_pool.submit(self.analyze_animal_with_ai, jpeg_bytes)
+                if saved.result():
+                    photo_paths.append(filepath)
             
-            # Upload photos
+            # Upload photos (from this thread, so the upload fan-out can't starve the pool)
             photo_links = self.upload_photos(photo_paths)
+            animal_description = ai_future.result() if ai_future else None
             
             # Send immediate notification with AI description
-            self.send_notification(tag_id, photo_links, animal_description)
+            self.send_notification(tag_id, photo_links, animal_description, now)
             
             # Update encounter history
-            now = datetime.now()
             self.encounter_history[tag_id].append(now)
             
             # Clean old history (keep only recent encounters)
-            cutoff = now - timedelta(days=7)
+            cutoff = now - ENCOUNTER_HISTORY_SECONDS
             while (self.encounter_history[tag_id] and 
                    self.encounter_history[tag_id][0] < cutoff):
                 self.encounter_history[tag_id].popleft()
                 
+            self._history_sweep_ctr += 1
+            if self._history_sweep_ctr % SWEEP_INTERVAL == 0:
+                self._prune_encounter_history(cutoff)
+                
         except Exception as e:
             self.logger.error(f"Error processing tag {tag_id}: {e}")
             
+    def _prune_encounter_history(self, cutoff):
+        """Drop expired encounters for every tag and remove tags with none left"""
+        for tag_id in list(self.encounter_history):
+            history = self.encounter_history[tag_id]
+            while history and history[0] < cutoff:
+                history.popleft()
+            if not history:
+                del self.encounter_history[tag_id]
+                
+    def _detection_worker(self):
+        """Process queued tag detections in order"""
+        while True:
+            tag_id = self._work_q.get()
+            if tag_id is None:  # Shutdown sentinel
+                break
+            self.process_tag_detection(tag_id)
+            
+    def queue_tag_detection(self, tag_id):
+        """Hand a detection to the worker without blocking the poll loop"""
+        try:
+            self._work_q.put_nowait(tag_id)
+        except queue.Full:
+            self.logger.warning(f"Detection backlog full, dropping tag {tag_id}")
+            
     def cleanup(self):
         """Cleanup resources"""
         self.logger.info("Cleaning up resources...")
         
+        # Stop in pipeline order: detections feed uploads, which feed notifications
+        if self._work_thread:
+            self._work_q.put(None)  # Finish queued detections, then stop
+            self._work_thread.join(timeout=120)
+            self.logger.info("Detection worker stopped")
+            
+        if self._upload_pool:
+            self._upload_pool.shutdown(wait=True)
+        self._stop_rclone_daemon()
+        
+        if self._http:
+            self._http.close()
+            
+        if self._mail_thread:
+            self._mail_q.put(None)  # Drain pending notifications, then stop
+            self._mail_thread.join(timeout=30)
+            self.logger.info("Notification worker stopped")
+            
         if self.serial_conn:
             self.serial_conn.close()
             self.logger.info("Serial connection closed")
@@ -403,15 +785,22 @@ class RFIDCameraSystem:
             self.logger.info("System initialized successfully, starting main loop...")
             self.running = True
             
-            # Main detection loop
+            # Main detection loop - paced by the blocking serial read, not a fixed sleep
+            last_detection = None
             while self.running:
                 try:
+                    # Keep a minimum gap between polls only right after a detection
+                    if last_detection is not None:
+                        gap = self.config['poll_interval'] - (time.monotonic() - last_detection)
+                        if gap > 0:
+                            time.sleep(gap)
+                        last_detection = None
+                        
                     tag_id = self.poll_reader()
                     
-                    if tag_id and self.should_process_tag(tag_id):
-                        self.process_tag_detection(tag_id)
-                        
-                    time.sleep(self.config['poll_interval'])
+                    if self.is_stable_read(tag_id) and self.should_process_tag(tag_id):
+                        self.queue_tag_detection(tag_id)
+                        last_detection = time.monotonic()
                     
                 except KeyboardInterrupt:
                     break
@@ -426,6 +815,7 @@ class RFIDCameraSystem:
         finally:
             self.cleanup()
             self.logger.info("System shutdown complete")
+            self._log_listener.stop()  # Flushes queued records
             
         return 0
 
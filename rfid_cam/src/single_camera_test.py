@@ -11,19 +11,28 @@ import logging
 import signal
 import re
 import subprocess
+import tempfile
 import smtplib
 import ssl
 import base64
 import json
+import mmap
+import secrets
+import urllib.request
+import urllib.error
 import threading
-import queue
-from collections import defaultdict, deque
-from datetime import datetime, timedelta, timezone
+import operator
+import functools
+import heapq
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
 
+import requests
 import serial
 from dotenv import load_dotenv
 from twilio.rest import Client
@@ -50,6 +59,30 @@ except ImportError:
     METADATA_AVAILABLE = False
     print("WARNING: Image metadata manager not available. Metadata features disabled.")
 
+# Optional libjpeg-turbo bindings for encoding stills off the camera buffer
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
+
+# 15-digit FDX-B tag ID in the reader's data field
+FDXB_PATTERN = re.compile(r'\d{15}')
+
+# Keywords that raise an AI description's score (substring matches, as before)
+ANIMAL_KEYWORDS = re.compile('cat|dog|kitten|puppy')
+COLOR_KEYWORDS = re.compile('black|white|brown|golden|tabby')
+
+# Size above which the per-tag timestamp maps are swept for stale entries
+TAG_CACHE_SIZE = 1024
+
+# Stand-in for the image data URL, replaced after the AI request body is serialized
+IMAGE_URL_PLACEHOLDER = '__IMAGE_URL__'
+
+# How long shutdown waits for queued detections to finish analysis and upload
+IO_DRAIN_SECONDS = 120
+
 
 class RFIDCameraSystem:
     """Single camera test version of RFID camera system"""
@@ -67,27 +100,58 @@ class RFIDCameraSystem:
         
         # Initialize state
         self.running = False
-        self.last_tag_time = {}  # For deduplication
+        self.last_tag_time = {}  # For deduplication (tag -> monotonic seconds)
         self.last_notification_time = {}  # For notification deduplication (60s)
         
         # Batching system
-        self.detection_queue = queue.Queue()
+        # Single producer/consumer, so a deque plus an Event is enough
+        self.detection_queue = deque()
+        self._detection_event = threading.Event()
         self.batch_processor_thread = None
         self.pending_batches = defaultdict(list)  # chip_id -> list of detections
-        self.batch_timers = {}  # chip_id -> timer
-        self.encounter_history = defaultdict(deque)  # chip_id -> deque of timestamps
+        self.batch_deadlines = {}  # chip_id -> monotonic time its batch is due
+        self.encounter_history = defaultdict(deque)  # chip_id -> deque of monotonic timestamps
+        
+        # Photo analysis, upload and notification run off the polling thread.
+        # Detections are never dropped; past io_queue_size pending uploads the
+        # oldest ones are deferred to the offline upload queue instead
+        self._io_queue = deque()
+        self._io_lock = threading.Lock()
+        self._io_event = threading.Event()
+        self.io_thread = None
         
         # Local backup and retry system
         self.local_backup_dir = Path(self.config['photo_dir']) / 'backup'
         self.local_backup_dir.mkdir(exist_ok=True)
-        self.upload_retry_queue = queue.Queue()
+        self.upload_retry_queue = deque()
+        self._retry_event = threading.Event()
         self.retry_thread = None
-        self.immediate_notifications_sent = set()  # Track immediate notifications to avoid duplicates
+        self.immediate_notifications_sent = OrderedDict()  # Bounded LRU; evict past TAG_CACHE_SIZE
         
         # Initialize components
         self.serial_conn = None
+        self._poll_cmd_cache = None  # ((addr, fmt), command)
+        self._poll_cmd_bytes = None
         self.camera = None  # Single camera for testing
+        self._jpeg = None
+        if TURBOJPEG_AVAILABLE:
+            try:
+                self._jpeg = TurboJPEG()
+                self.logger.info("Using libjpeg-turbo for still encoding")
+            except (OSError, RuntimeError) as e:
+                self.logger.warning(f"libjpeg-turbo unavailable, using camera encoder: {e}")
         self.twilio_client = None
+        self._http = None  # Keep-alive session for the OpenAI API
+        
+        # rclone rc daemon (uploads fall back to the rclone CLI without it)
+        self._rclone_proc = None
+        self._rc_url = None
+        self._rc_auth = None
+        
+        # Persistent SMTP connection, closed after smtp_idle_seconds without a send
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+        self._smtp_timer = None
         
         # Initialize GPS and metadata managers
         self.gps_manager = None
@@ -148,6 +212,8 @@ class RFIDCameraSystem:
             'photo_dir': Path(os.getenv('PHOTO_DIR', '/home/collins/rfid_photos')),
             'rclone_remote': os.getenv('RCLONE_REMOTE', ''),
             'rclone_path': os.getenv('RCLONE_PATH', 'rfid_photos'),
+            'rclone_rcd': os.getenv('RCLONE_RCD', 'true').lower() == 'true',
+            'rclone_rc_addr': os.getenv('RCLONE_RC_ADDR', '127.0.0.1:5572'),
             'twilio_sid': os.getenv('TWILIO_ACCOUNT_SID', ''),
             'twilio_auth_token': os.getenv('TWILIO_AUTH_TOKEN', ''),
             'twilio_from_number': os.getenv('TWILIO_FROM_NUMBER', ''),
@@ -161,10 +227,12 @@ class RFIDCameraSystem:
             'batch_delay_minutes': float(os.getenv('BATCH_DELAY_MINUTES', '1')),
             'encounter_window_minutes': int(os.getenv('ENCOUNTER_WINDOW_MINUTES', '30')),
             'max_photos_per_batch': int(os.getenv('MAX_PHOTOS_PER_BATCH', '5')),
+            'io_queue_size': int(os.getenv('IO_QUEUE_SIZE', '8')),
             'smtp_host': os.getenv('SMTP_HOST', 'smtp.gmail.com'),
             'smtp_port': int(os.getenv('SMTP_PORT', '587')),
             'smtp_user': os.getenv('SMTP_USER', ''),
             'smtp_pass': os.getenv('SMTP_PASS', ''),
+            'smtp_idle_seconds': int(os.getenv('SMTP_IDLE_SECONDS', '300')),
             'email_from': os.getenv('EMAIL_FROM', ''),
             'alert_to_email': os.getenv('ALERT_TO_EMAIL', ''),
             
@@ -178,6 +246,7 @@ class RFIDCameraSystem:
             'EMBED_METADATA': os.getenv('EMBED_METADATA', 'true'),
             'SAVE_METADATA_JSON': os.getenv('SAVE_METADATA_JSON', 'true'),
             'METADATA_QUALITY': os.getenv('METADATA_QUALITY', 'high'),
+            'SIDECAR_FORMAT': os.getenv('SIDECAR_FORMAT', 'json'),
             
             # Resilience Configuration
             'ai_fallback_message': os.getenv('AI_FALLBACK_MESSAGE', 'AI analysis not available'),
@@ -213,8 +282,10 @@ class RFIDCameraSystem:
             self.serial_conn = serial.Serial(
                 port=self.config['port'],
                 baudrate=self.config['baud'],
-                timeout=1.0
+                timeout=1.0,
+                inter_byte_timeout=0.05  # Give up on a stalled frame quickly
             )
+            self._poll_cmd_bytes = self.create_poll_command().encode('ascii')
             self.logger.info(f"Serial connection established on {self.config['port']} at {self.config['baud']} baud")
             return True
         except serial.SerialException as e:
@@ -235,14 +306,15 @@ class RFIDCameraSystem:
             config = self.camera.create_still_configuration(
                 main={"size": (2304, 1296)},  # 3MP still
                 lores={"size": (640, 480)},   # Preview for AF
-                display="lores"
+                display="lores",
+                buffer_count=3                # Keep frames flowing while one is held for a still
             )
             self.camera.configure(config)
             self.camera.set_controls({"AfMode": 2})  # Continuous AF
             self.camera.start()
             
-            # Allow time for camera to initialize
-            time.sleep(2)
+            # Wait for the first frame rather than a fixed warm-up delay
+            self.camera.capture_metadata()
             
             self.logger.info("Camera initialized successfully (single camera test mode)")
             return True
@@ -261,24 +333,145 @@ class RFIDCameraSystem:
             except TwilioException as e:
                 self.logger.warning(f"Failed to initialize Twilio: {e}")
                 
+        # Long-lived rclone daemon so uploads don't launch rclone per photo
+        self.start_rclone_daemon()
+        
+        # Reuse one connection to the OpenAI API across photos
+        if self.config['openai_api_key']:
+            self._http = requests.Session()
+            self._http.headers.update({
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.config['openai_api_key']}"
+            })
+            
         # Test SMTP if configured
         if self.config['smtp_user'] and self.config['smtp_pass']:
             self.logger.info("Email notifications configured")
             
+    def start_rclone_daemon(self):
+        """Start an rclone rc daemon for uploads, falling back to the rclone CLI"""
+        if not self.config['rclone_remote'] or not self.config['rclone_rcd']:
+            return
+            
+        # Random per-run credentials, passed via environment to keep them out of ps
+        user, password = 'rfid_cam', secrets.token_urlsafe(16)
+        env = dict(os.environ, RCLONE_RC_USER=user, RCLONE_RC_PASS=password)
+        try:
+            self._rclone_proc = subprocess.Popen(
+                ['rclone', 'rcd', f"--rc-addr={self.config['rclone_rc_addr']}"],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            self.logger.warning(f"Could not start rclone daemon, using rclone CLI: {e}")
+            return
+            
+        self._rc_url = f"http://{self.config['rclone_rc_addr']}/"
+        self._rc_auth = 'Basic ' + base64.b64encode(f"{user}:{password}".encode()).decode('ascii')
+        
+        # Wait for the daemon to accept requests
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and self._rclone_proc.poll() is None:
+            try:
+                self.rc_call('rc/noop', {}, timeout=1)
+                self.logger.info(f"rclone daemon ready on {self.config['rclone_rc_addr']}")
+                return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+                
+        self.logger.warning("rclone daemon not responding, using rclone CLI")
+        self.stop_rclone_daemon()
+        
+    def stop_rclone_daemon(self):
+        """Stop the rclone rc daemon if running"""
+        self._rc_url = None
+        if self._rclone_proc and self._rclone_proc.poll() is None:
+            self._rclone_proc.terminate()
+            try:
+                self._rclone_proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._rclone_proc.kill()
+        self._rclone_proc = None
+        
+    def rc_call(self, command, params, timeout=60):
+        """POST a command to the rclone rc daemon and return its JSON reply"""
+        request = urllib.request.Request(
+            self._rc_url + command,
+            data=json.dumps(params).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Authorization': self._rc_auth},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b'{}')
+            
+    def smtp_connect(self):
+        """Open and authenticate an SMTP connection"""
+        server = smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port'], timeout=30)
+        server.starttls()
+        server.login(self.config['smtp_user'], self.config['smtp_pass'])
+        return server
+        
+    def smtp_close(self):
+        """Close the persistent SMTP connection (caller holds the lock)"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+            
+    def smtp_send(self, msg):
+        """Send over the persistent SMTP connection, reconnecting once if it has dropped"""
+        with self._smtp_lock:
+            for attempt in range(2):
+                try:
+                    if self._smtp is None:
+                        self._smtp = self.smtp_connect()
+                    self._smtp.send_message(msg)
+                    break
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    self.smtp_close()
+                    if attempt:
+                        raise
+                        
+            # Restart the idle countdown
+            if self._smtp_timer is not None:
+                self._smtp_timer.cancel()
+            self._smtp_timer = threading.Timer(self.config['smtp_idle_seconds'], self.smtp_idle_close)
+            self._smtp_timer.daemon = True
+            self._smtp_timer.start()
+            
+    def smtp_idle_close(self):
+        """Idle timer callback - stay within the server's connection limits"""
+        with self._smtp_lock:
+            self.smtp_close()
+            
     def calculate_bcc(self, data):
         """Calculate BCC (XOR checksum) for A04 protocol"""
-        bcc = 0
-        for byte in data.encode('ascii'):
-            bcc ^= byte
+        raw = data.encode('ascii')
+        if len(raw) < 16:
+            bcc = functools.reduce(operator.xor, raw, 0)
+        else:
+            # Longer frames: read the payload as one integer and XOR its halves
+            # together until a single byte is left, so the work stays in C
+            bcc = int.from_bytes(raw, 'little')
+            width = len(raw)
+            while width > 1:
+                half = (width + 1) // 2
+                bcc = (bcc >> (half * 8)) ^ (bcc & ((1 << (half * 8)) - 1))
+                width = half
         return f"{bcc:02X}"
         
     def create_poll_command(self):
         """Create polling command for A04 reader"""
         addr = self.config['poll_addr']
         fmt = self.config['poll_fmt']
+        if self._poll_cmd_cache and self._poll_cmd_cache[0] == (addr, fmt):
+            return self._poll_cmd_cache[1]
         payload = f"A{addr}01{fmt}"
         bcc = self.calculate_bcc(payload)
-        return f"${payload}{bcc}#"
+        command = f"${payload}{bcc}#"
+        self._poll_cmd_cache = ((addr, fmt), command)
+        return command
         
     def parse_response(self, response):
         """Parse response from A04 reader and extract 15-digit FDX-B ID"""
@@ -302,50 +495,86 @@ class RFIDCameraSystem:
             return None
             
         # Look for 15-digit FDX-B ID pattern in the data
-        fdx_match = re.search(r'(\d{15})', data)
+        fdx_match = FDXB_PATTERN.search(data)
         if fdx_match:
-            return fdx_match.group(1)
+            return fdx_match.group()
             
         return None
         
     def is_duplicate_tag(self, tag_id):
         """Check if this tag was recently detected (deduplication)"""
-        now = datetime.now()
-        if tag_id in self.last_tag_time:
-            time_diff = (now - self.last_tag_time[tag_id]).total_seconds()
-            if time_diff < self.config['dedupe_seconds']:
-                return True
+        now = time.monotonic()
+        last = self.last_tag_time.get(tag_id)
+        if last is not None and now - last < self.config['dedupe_seconds']:
+            return True
                 
         self.last_tag_time[tag_id] = now
+        if len(self.last_tag_time) > TAG_CACHE_SIZE:
+            self._prune_tag_times(self.last_tag_time, now)
         return False
         
-    def capture_photo(self, tag_id):
-        """Capture photo from single camera with GPS and metadata integration"""
-        capture_time = datetime.now(timezone.utc)
+    def _prune_tag_times(self, times, now):
+        """Drop tags that have not been seen for well past any dedupe window"""
+        cutoff = now - max(self.config['dedupe_seconds'], 60) * 10
+        for tag_id in [t for t, seen in times.items() if seen < cutoff]:
+            del times[tag_id]
+        
+    def capture_photo(self, tag_id, capture_time):
+        """Capture photo from single camera"""
         timestamp = capture_time.strftime("%Y%m%d_%H%M%S")
         photo_paths = []
         
         if not self.camera:
             self.logger.error("Camera not initialized")
             return photo_paths
+                
+        try:
+            filename = f"{timestamp}_{tag_id}_cam0.jpg"
+            filepath = self.config['photo_dir'] / filename
+            
+            # Capture still image straight from the camera's buffer, releasing it
+            # promptly so libcamera doesn't run out of buffers
+            request = self.camera.capture_request()
+            try:
+                if self._jpeg:
+                    frame = request.make_array('main')  # Copy out so the buffer can go back
+                else:
+                    request.save('main', str(filepath))
+            finally:
+                request.release()
+                
+            if self._jpeg:
+                # BGR888 main stream arrays are in R, G, B byte order
+                jpeg = memoryview(self._jpeg.encode(
+                    frame, quality=90, pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420))
+                
+                # Straight to the fd, skipping the buffered file object
+                fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    while jpeg:
+                        jpeg = jpeg[os.write(fd, jpeg):]
+                finally:
+                    os.close(fd)
+            
+            photo_paths.append(filepath)
+            self.logger.info(f"Photo saved: {filepath}")
+            
+        except Exception as e:
+            self.logger.error(f"Failed to capture photo: {e}")
+                
+        return photo_paths
         
+    def annotate_photos(self, tag_id, photo_paths, capture_time):
+        """Add GPS, AI analysis and metadata to captured photos"""
         # Get GPS coordinates if available
         gps_coordinates = None
-        gps_info = ""
         if self.gps_manager and self.gps_manager.is_gps_available():
             gps_coordinates = self.gps_manager.get_coordinates_for_exif()
-            gps_info = f" {self.gps_manager.get_location_string()}"
             self.logger.info(f"GPS data available: {self.gps_manager.get_location_string()}")
         else:
             self.logger.debug("No GPS data available")
-                
-        try:
-            filename = f"{timestamp}_{tag_id}_cam0.jpg"
-            filepath = self.config['photo_dir'] / filename
-            
-            # Capture still image
-            self.camera.capture_file(str(filepath))
             
+        for filepath in photo_paths:
             # Get AI analysis if enabled
             ai_description = None
             if self.config['animal_identification']:
@@ -383,18 +612,10 @@ class RFIDCameraSystem:
                         }
                     )
                     
-                    self.logger.info(f"Metadata processed for {filename} (AI: {'Yes' if ai_description else 'No'})")
+                    self.logger.info(f"Metadata processed for {filepath.name} (AI: {'Yes' if ai_description else 'No'})")
                     
                 except Exception as e:
-                    self.logger.error(f"Failed to process metadata for {filename}: {e}")
-            
-            photo_paths.append(filepath)
-            self.logger.info(f"Photo saved: {filepath}{gps_info}")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to capture photo: {e}")
-                
-        return photo_paths
+                    self.logger.error(f"Failed to process metadata for {filepath.name}: {e}")
         
     def upload_photos(self, photo_paths):
         """Upload photos using rclone and return specific photo links, with offline queue on failure"""
@@ -412,31 +633,17 @@ class RFIDCameraSystem:
             self.queue_photos_for_later(photo_paths)
             return [f"Queued for upload: {Path(p).name}" for p in photo_paths]
             
-        for photo_path in photo_paths:
-            try:
-                remote_path = f"{self.config['rclone_remote']}:{self.config['rclone_path']}"
-                cmd = ['rclone', 'copy', str(photo_path), remote_path]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-                
-                if result.returncode == 0:
-                    self.logger.info(f"Upload successful: {photo_path.name}")
-                    
-                    # Get specific photo link
-                    photo_link = self.get_photo_link(photo_path.name)
-                    if photo_link:
-                        photo_links.append(photo_link)
-                        self.logger.info(f"Photo link: {photo_link}")
-                else:
-                    self.logger.warning(f"Upload failed for {photo_path.name}: {result.stderr}")
-                    failed_uploads.append(photo_path)
-                    
-            except subprocess.TimeoutExpired:
-                self.logger.warning(f"Upload timeout for {photo_path.name}")
-                failed_uploads.append(photo_path)
-            except Exception as e:
-                self.logger.error(f"Upload error for {photo_path.name}: {e}")
-                failed_uploads.append(photo_path)
+        if self._rc_url:
+            uploaded, failed_uploads = self.upload_photos_rc(photo_paths)
+        else:
+            uploaded, failed_uploads = self.upload_photos_cli(photo_paths)
+            
+        # Get specific photo links
+        for photo_path in uploaded:
+            photo_link = self.get_photo_link(photo_path.name)
+            if photo_link:
+                photo_links.append(photo_link)
+                self.logger.info(f"Photo link: {photo_link}")
                 
         # Handle failed uploads - queue for retry
         if failed_uploads:
@@ -445,11 +652,74 @@ class RFIDCameraSystem:
             
             # Also store locally as backup
             backup_paths = self.store_photos_locally(failed_uploads)
-            for backup_path in backup_paths:
-                self.upload_retry_queue.put(backup_path)
+            self.upload_retry_queue.extend(backup_paths)
+            self._retry_event.set()
                 
         return photo_links
     
+    def upload_photos_cli(self, photo_paths):
+        """Upload photos with the rclone CLI, returning (uploaded, failed) path lists"""
+        uploaded = []
+        failed = []
+        
+        # One rclone process per source directory rather than per photo
+        remote_path = f"{self.config['rclone_remote']}:{self.config['rclone_path']}"
+        by_dir = defaultdict(list)
+        for photo_path in photo_paths:
+            by_dir[photo_path.parent].append(photo_path)
+            
+        for src_dir, paths in by_dir.items():
+            names = ', '.join(p.name for p in paths)
+            try:
+                with tempfile.NamedTemporaryFile('w', suffix='.txt') as file_list:
+                    file_list.write(''.join(f"{p.name}\n" for p in paths))
+                    file_list.flush()
+                    cmd = ['rclone', 'copy', '--files-from-raw', file_list.name,
+                           str(src_dir), remote_path]
+                    
+                    result = subprocess.run(cmd, capture_output=True, text=True,
+                                            timeout=30 * len(paths))
+                
+                if result.returncode == 0:
+                    self.logger.info(f"Upload successful: {names}")
+                    uploaded.extend(paths)
+                else:
+                    self.logger.warning(f"Upload failed for {names}: {result.stderr}")
+                    failed.extend(paths)
+                    
+            except subprocess.TimeoutExpired:
+                self.logger.warning(f"Upload timeout for {names}")
+                failed.extend(paths)
+            except Exception as e:
+                self.logger.error(f"Upload error for {names}: {e}")
+                failed.extend(paths)
+                
+        return uploaded, failed
+        
+    def upload_photos_rc(self, photo_paths):
+        """Upload photos through the rclone daemon, returning (uploaded, failed) path lists"""
+        uploaded = []
+        failed = []
+        
+        for photo_path in photo_paths:
+            try:
+                self.rc_call('operations/copyfile', {
+                    'srcFs': str(photo_path.parent),
+                    'srcRemote': photo_path.name,
+                    'dstFs': f"{self.config['rclone_remote']}:",
+                    'dstRemote': f"{self.config['rclone_path']}/{photo_path.name}"
+                }, timeout=30)
+                self.logger.info(f"Upload successful: {photo_path.name}")
+                uploaded.append(photo_path)
+            except (TimeoutError, urllib.error.URLError) as e:
+                self.logger.warning(f"Upload failed for {photo_path.name}: {e}")
+                failed.append(photo_path)
+            except Exception as e:
+                self.logger.error(f"Upload error for {photo_path.name}: {e}")
+                failed.append(photo_path)
+                
+        return uploaded, failed
+        
     def check_internet_connectivity(self, timeout=10):
         """Check if internet is available by testing connection to Google DNS"""
         try:
@@ -512,15 +782,22 @@ class RFIDCameraSystem:
         """Get specific Google Drive link for a photo"""
         try:
             # Try to get direct link to the specific file
-            remote_file_path = f"{self.config['rclone_remote']}:{self.config['rclone_path']}/{filename}"
-            
-            result = subprocess.run(
-                ['rclone', 'link', remote_file_path],
-                capture_output=True, text=True, timeout=10
-            )
-            
-            if result.returncode == 0:
+            if self._rc_url:
+                link = self.rc_call('operations/publiclink', {
+                    'fs': f"{self.config['rclone_remote']}:",
+                    'remote': f"{self.config['rclone_path']}/{filename}"
+                }, timeout=10).get('url', '')
+                returncode, stderr = (0, '') if link else (1, 'no link returned')
+            else:
+                remote_file_path = f"{self.config['rclone_remote']}:{self.config['rclone_path']}/{filename}"
+                result = subprocess.run(
+                    ['rclone', 'link', remote_file_path],
+                    capture_output=True, text=True, timeout=10
+                )
                 link = result.stdout.strip()
+                returncode, stderr = result.returncode, result.stderr
+            
+            if returncode == 0:
                 # Convert to direct view link if it's a Google Drive link
                 if 'drive.google.com' in link and 'open?id=' in link:
                     # Convert from open?id= to file/d/ format for direct viewing
@@ -529,9 +806,9 @@ class RFIDCameraSystem:
                     return full_link
                 return link
             else:
-                self.logger.warning(f"Failed to get link for {filename}: {result.stderr}")
+                self.logger.warning(f"Failed to get link for {filename}: {stderr}")
                 
-        except subprocess.TimeoutExpired:
+        except (subprocess.TimeoutExpired, TimeoutError):
             self.logger.warning(f"Link generation timeout for {filename}")
         except Exception as e:
             self.logger.warning(f"Link generation error for {filename}: {e}")
@@ -564,25 +841,18 @@ class RFIDCameraSystem:
     
     def identify_animal(self, photo_path):
         """Use OpenAI GPT-4 Vision to identify animals and humans in the photo"""
-        if not self.config['animal_identification'] or not self.config['openai_api_key']:
+        if not self.config['animal_identification'] or not self._http:
             return None
             
         try:
-            import urllib.request
-            import urllib.parse
-            
-            # Encode image to base64
-            with open(photo_path, 'rb') as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            # Encode straight from the page cache without reading the file into memory
+            with open(photo_path, 'rb') as image_file, \
+                    mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                base64_image = base64.b64encode(mm)
             
             # Prepare OpenAI API request
             api_url = "https://api.openai.com/v1/chat/completions"
             
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.config['openai_api_key']}"
-            }
-            
             payload = {
                 "model": "gpt-4o-mini",
                 "messages": [
@@ -596,7 +866,7 @@ class RFIDCameraSystem:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
+                                    "url": IMAGE_URL_PLACEHOLDER,
                                     "detail": "low"
                                 }
                             }
@@ -607,12 +877,13 @@ class RFIDCameraSystem:
                 "temperature": 0.3
             }
             
-            # Make API request
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(api_url, data=data, headers=headers)
-            
-            with urllib.request.urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode('utf-8'))
+            # Make API request; base64 needs no JSON escaping, so splice it in after dumps
+            head, tail = json.dumps(payload).encode('ascii').split(IMAGE_URL_PLACEHOLDER.encode('ascii'))
+            data = b''.join((head, b'data:image/jpeg;base64,', base64_image, tail))
+            del base64_image
+            response = self._http.post(api_url, data=data, timeout=30)
+            response.raise_for_status()
+            result = response.json()
                 
             if 'choices' in result and len(result['choices']) > 0:
                 animal_description = result['choices'][0]['message']['content'].strip().lower()
@@ -637,10 +908,28 @@ class RFIDCameraSystem:
     
     def _batch_processor_worker(self):
         """Background worker that processes detection batches"""
+        # Min-heap of (deadline, chip_id); entries superseded by a later
+        # detection are skipped when they surface
+        due = []
         while self.running:
             try:
-                # Wait for detection or timeout
-                detection = self.detection_queue.get(timeout=1.0)
+                # Process batches whose quiet period has elapsed
+                now = time.monotonic()
+                while due and due[0][0] <= now:
+                    deadline, chip_id = heapq.heappop(due)
+                    if self.batch_deadlines.get(chip_id) == deadline:
+                        del self.batch_deadlines[chip_id]
+                        self._process_batch(chip_id)
+                    now = time.monotonic()
+                    
+                # Wait for detection, the next batch deadline or timeout
+                try:
+                    detection = self.detection_queue.popleft()
+                except IndexError:
+                    timeout = min(1.0, due[0][0] - now) if due else 1.0
+                    self._detection_event.wait(timeout)
+                    self._detection_event.clear()
+                    continue
                 if detection is None:  # Shutdown signal
                     break
                     
@@ -649,29 +938,21 @@ class RFIDCameraSystem:
                 # Add to pending batch
                 self.pending_batches[chip_id].append(detection)
                 
-                # Cancel existing timer for this chip if any
-                if chip_id in self.batch_timers:
-                    self.batch_timers[chip_id].cancel()
-                
-                # Start new timer for batch processing
-                delay = self.config['batch_delay_minutes'] * 60
-                timer = threading.Timer(delay, self._process_batch, args=[chip_id])
-                timer.start()
-                self.batch_timers[chip_id] = timer
+                # Push this chip's batch deadline back
+                deadline = time.monotonic() + self.config['batch_delay_minutes'] * 60
+                self.batch_deadlines[chip_id] = deadline
+                heapq.heappush(due, (deadline, chip_id))
                 
                 self.logger.info(f"Detection queued for {chip_id}, batch will process in {self.config['batch_delay_minutes']} minute(s)")
                 
-            except queue.Empty:
-                continue
             except Exception as e:
                 self.logger.error(f"Batch processor error: {e}")
     
     def _process_batch(self, chip_id):
         """Process accumulated detections for a chip ID"""
         try:
-            self.logger.info(f"BATCH TIMER TRIGGERED for chip {chip_id}")
-            batch = self.pending_batches[chip_id].copy()
-            self.pending_batches[chip_id].clear()
+            self.logger.info(f"BATCH DEADLINE REACHED for chip {chip_id}")
+            batch = self.pending_batches.pop(chip_id, [])
             
             if not batch:
                 self.logger.warning(f"No batch data found for chip {chip_id}")
@@ -689,15 +970,13 @@ class RFIDCameraSystem:
                 # Send the final notification
                 self._send_batch_notification(best_detection, stats)
                 
-                # Update encounter history
-                now = datetime.now()
-                self.encounter_history[chip_id].append(now)
-                
-                # Clean old history (keep only recent encounters)
-                cutoff = now - timedelta(days=7)  # Keep 7 days of history
-                while (self.encounter_history[chip_id] and 
-                       self.encounter_history[chip_id][0] < cutoff):
-                    self.encounter_history[chip_id].popleft()
+                # Update encounter history, trimming the oldest end as we append
+                now = time.monotonic()
+                history = self.encounter_history[chip_id]
+                history.append(now)
+                cutoff = now - 7 * 86400  # Keep 7 days of history
+                while history and history[0] < cutoff:
+                    history.popleft()
                     
         except Exception as e:
             self.logger.error(f"Batch processing failed for {chip_id}: {e}")
@@ -715,43 +994,35 @@ class RFIDCameraSystem:
                 detection['animal_description'] = animal_description
             return detection
         
-        # Multiple detections - try AI analysis on each until we get a good result
+        # Multiple detections - run AI analysis on up to 3 at once, stopping
+        # as soon as one gives a really good identification
+        candidates = [d for d in batch if d['photo_paths']]
         best_detection = None
         best_score = -1
+        best_index = len(candidates)
         
-        for detection in batch:
-            if not detection['photo_paths']:
-                continue
-                
+        if candidates:
+            executor = ThreadPoolExecutor(max_workers=min(3, len(candidates)))
+            futures = {executor.submit(self._score_detection, d): i for i, d in enumerate(candidates)}
             try:
-                animal_description = self.identify_animal(detection['photo_paths'][0])
-                
-                # Score based on AI response quality
-                score = 0
-                if animal_description and animal_description.lower() != 'no animals in view':
-                    if animal_description != 'animal':  # Generic response
-                        score = 10
-                        if any(word in animal_description.lower() for word in ['cat', 'dog', 'kitten', 'puppy']):
-                            score += 5
-                        if any(word in animal_description.lower() for word in ['black', 'white', 'brown', 'golden', 'tabby']):
-                            score += 3
-                else:
-                    # No animals detected, set to None
-                    animal_description = None
-                
-                detection['animal_description'] = animal_description
-                detection['ai_score'] = score
-                
-                if score > best_score:
-                    best_score = score
-                    best_detection = detection
-                    
-                # If we got a really good identification, use it
-                if score >= 15:
-                    break
-                    
-            except Exception as e:
-                self.logger.warning(f"AI analysis failed for detection: {e}")
+                for future in as_completed(futures):
+                    try:
+                        score = future.result()
+                    except Exception as e:
+                        self.logger.warning(f"AI analysis failed for detection: {e}")
+                        continue
+                        
+                    # Ties go to the earlier detection, as with a sequential scan
+                    index = futures[future]
+                    if score > best_score or (score == best_score and index < best_index):
+                        best_score, best_index = score, index
+                        best_detection = candidates[index]
+                        
+                    # If we got a really good identification, use it
+                    if score >= 15:
+                        break
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
         
         # Fallback to first detection if no AI analysis worked
         if not best_detection:
@@ -760,16 +1031,39 @@ class RFIDCameraSystem:
             
         return best_detection
     
+    def _score_detection(self, detection):
+        """Run AI analysis on a detection's photo and score the response quality"""
+        animal_description = self.identify_animal(detection['photo_paths'][0])
+        
+        # Score based on AI response quality
+        score = 0
+        description = animal_description.lower() if animal_description else ''
+        if description and description != 'no animals in view':
+            if animal_description != 'animal':  # Generic response
+                score = 10
+                if ANIMAL_KEYWORDS.search(description):
+                    score += 5
+                if COLOR_KEYWORDS.search(description):
+                    score += 3
+        else:
+            # No animals detected, set to None
+            animal_description = None
+        
+        detection['animal_description'] = animal_description
+        detection['ai_score'] = score
+        return score
+        
     def _calculate_encounter_stats(self, chip_id):
         """Calculate encounter statistics for a chip ID"""
-        now = datetime.now()
-        window_start = now - timedelta(minutes=self.config['encounter_window_minutes'])
+        window_start = time.monotonic() - self.config['encounter_window_minutes'] * 60
         
-        # Count recent encounters (including current batch)
+        # Count recent encounters (including current batch); history is in
+        # insertion order, so walk back from the newest and stop at the window
         recent_count = 1  # Current encounter
-        for timestamp in self.encounter_history[chip_id]:
-            if timestamp >= window_start:
-                recent_count += 1
+        for timestamp in reversed(self.encounter_history[chip_id]):
+            if timestamp < window_start:
+                break
+            recent_count += 1
         
         # Total historical encounters
         total_count = len(self.encounter_history[chip_id]) + 1  # +1 for current
@@ -839,10 +1133,7 @@ class RFIDCameraSystem:
             if not is_sms_gateway:
                 msg['Subject'] = subject
             
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            self.smtp_send(msg)
                 
             self.logger.info(f"Batched notification sent for {chip_id} (animal: {animal_description or 'unknown'}) - SMS mode: {is_sms_gateway}")
             
@@ -866,38 +1157,37 @@ class RFIDCameraSystem:
         while self.running:
             try:
                 # Wait for failed uploads to retry
-                if not self.upload_retry_queue.empty():
-                    backup_path = self.upload_retry_queue.get(timeout=5)
-                    
-                    # Try to upload again
-                    self.logger.info(f"Retrying upload: {backup_path}")
+                try:
+                    backup_path = self.upload_retry_queue.popleft()
+                except IndexError:
+                    self._retry_event.wait(5)  # Wait when queue is empty
+                    self._retry_event.clear()
+                    continue
+                
+                # Try to upload again
+                self.logger.info(f"Retrying upload: {backup_path}")
+                
+                try:
+                    if self._rc_url:
+                        uploaded, _ = self.upload_photos_rc([backup_path])
+                    else:
+                        uploaded, _ = self.upload_photos_cli([backup_path])
                     
-                    try:
-                        remote_path = f"{self.config['rclone_remote']}:{self.config['rclone_path']}"
-                        cmd = ['rclone', 'copy', str(backup_path), remote_path]
-                        
-                        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-                        
-                        if result.returncode == 0:
-                            self.logger.info(f"Retry upload successful: {backup_path.name}")
-                            # Remove from backup after successful upload
-                            backup_path.unlink(missing_ok=True)
-                        else:
-                            self.logger.warning(f"Retry upload failed: {backup_path.name}")
-                            # Put back in queue for next retry (with delay)
-                            time.sleep(30)  # Wait 30 seconds before re-queuing
-                            self.upload_retry_queue.put(backup_path)
-                            
-                    except Exception as e:
-                        self.logger.error(f"Retry upload error for {backup_path}: {e}")
-                        # Re-queue for later retry
-                        self.upload_retry_queue.put(backup_path)
+                    if uploaded:
+                        self.logger.info(f"Retry upload successful: {backup_path.name}")
+                        # Remove from backup after successful upload
+                        backup_path.unlink(missing_ok=True)
+                    else:
+                        self.logger.warning(f"Retry upload failed: {backup_path.name}")
+                        # Put back in queue for next retry (with delay)
+                        time.sleep(30)  # Wait 30 seconds before re-queuing
+                        self.upload_retry_queue.append(backup_path)
                         
-                else:
-                    time.sleep(5)  # Wait when queue is empty
+                except Exception as e:
+                    self.logger.error(f"Retry upload error for {backup_path}: {e}")
+                    # Re-queue for later retry
+                    self.upload_retry_queue.append(backup_path)
                     
-            except queue.Empty:
-                continue
             except Exception as e:
                 self.logger.error(f"Retry processor error: {e}")
                 time.sleep(5)
@@ -916,13 +1206,14 @@ class RFIDCameraSystem:
             return False
             
         # Check notification deduplication (60 seconds)
-        now = datetime.now()
-        if tag_id in self.last_notification_time:
-            time_diff = (now - self.last_notification_time[tag_id]).total_seconds()
-            if time_diff < 60:
-                return False
+        now = time.monotonic()
+        last = self.last_notification_time.get(tag_id)
+        if last is not None and now - last < 60:
+            return False
                 
         self.last_notification_time[tag_id] = now
+        if len(self.last_notification_time) > TAG_CACHE_SIZE:
+            self._prune_tag_times(self.last_notification_time, now)
         return True
         
     def send_sms(self, tag_id):
@@ -1012,11 +1303,8 @@ class RFIDCameraSystem:
             msg['To'] = self.config['alert_to_email'] 
             msg['Subject'] = subject
             
-            # Create SMTP session
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            # Send over the shared SMTP session
+            self.smtp_send(msg)
                 
             self.logger.info("Email sent successfully")
             
@@ -1125,10 +1413,7 @@ class RFIDCameraSystem:
                 msg.attach(img)
             
             # Send email
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            self.smtp_send(msg)
                 
             self.logger.info(f"Email with attachment sent successfully: {photo_path.name}")
             
@@ -1144,11 +1429,8 @@ class RFIDCameraSystem:
             msg['To'] = self.config['alert_to_email'] 
             msg['Subject'] = subject
             
-            # Create SMTP session
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            # Send over the shared SMTP session
+            self.smtp_send(msg)
                 
             self.logger.info("Simple email sent successfully")
             
@@ -1165,11 +1447,8 @@ class RFIDCameraSystem:
             msg['To'] = self.config['alert_to_email'] 
             # No Subject header for SMS gateway
             
-            # Create SMTP session
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            # Send over the shared SMTP session
+            self.smtp_send(msg)
                 
             self.logger.info("SMS gateway email sent successfully (no subject)")
             
@@ -1258,10 +1537,7 @@ class RFIDCameraSystem:
                             self.logger.warning(f"Failed to attach {photo_name}: {e}")
             
             # Send email
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            self.smtp_send(msg)
                 
             self.logger.info(f"Daily summary sent with {len(detections)} detections")
             
@@ -1272,18 +1548,73 @@ class RFIDCameraSystem:
             self.logger.error(f"Failed to send daily summary: {e}")
             
     def process_tag(self, tag_id):
-        """Process a detected tag - send immediate notification then queue for detailed batching"""
+        """Process a detected tag - capture a photo and hand the rest to the I/O worker"""
         self.logger.info(f"Tag detected: {tag_id}")
         
-        photo_paths = []
-        photo_links = []
+        # Capture on the polling thread so the photo matches the detection
+        capture_time = datetime.now(timezone.utc)
+        photo_paths = self.capture_photo(tag_id, capture_time)
+        
+        with self._io_lock:
+            # Shed upload work, never the detection itself, once uploads back up;
+            # the lost pet's photos always upload
+            uploads = [task for task in self._io_queue
+                       if task and task['upload'] and task['chip_id'] != self.config['lost_tag']]
+            if len(uploads) >= self.config['io_queue_size']:
+                uploads[0]['upload'] = False
+                self.logger.warning(f"I/O queue backed up, deferring upload for {uploads[0]['chip_id']}")
+                
+            self._io_queue.append({
+                'chip_id': tag_id,
+                'capture_time': capture_time,
+                'photo_paths': photo_paths,
+                'upload': True
+            })
+        self._io_event.set()
         
-        # Always capture photos for analysis
-        photo_paths = self.capture_photo(tag_id)
+    def start_io_processor(self):
+        """Start the background thread for photo analysis, uploads and notifications"""
+        if self.io_thread and self.io_thread.is_alive():
+            return
+            
+        self.io_thread = threading.Thread(target=self._io_worker, daemon=True)
+        self.io_thread.start()
+        self.logger.info("I/O processor thread started")
+        
+    def _io_worker(self):
+        """Background worker that finishes captured detections until the shutdown signal"""
+        # Runs until the sentinel rather than on self.running, so queued work drains on shutdown
+        while True:
+            try:
+                try:
+                    with self._io_lock:
+                        task = self._io_queue.popleft()
+                except IndexError:
+                    self._io_event.wait(1.0)
+                    self._io_event.clear()
+                    continue
+                if task is None:  # Shutdown signal
+                    break
+                    
+                self._finish_detection(task)
+                
+            except Exception as e:
+                self.logger.error(f"I/O processor error: {e}")
+                
+    def _finish_detection(self, task):
+        """Analyze and upload photos, send immediate notification then queue for detailed batching"""
+        tag_id = task['chip_id']
+        photo_paths = task['photo_paths']
+        photo_links = []
         
         # Upload photos to get links (with local backup on failure)
         if photo_paths:
-            photo_links = self.upload_photos(photo_paths)
+            self.annotate_photos(tag_id, photo_paths, task['capture_time'])
+            if task['upload']:
+                photo_links = self.upload_photos(photo_paths)
+            else:
+                # Upload shed while the queue was backed up
+                self.queue_photos_for_later(photo_paths)
             
         # Send AI-enhanced notification on every detection (for testing)
         self.send_immediate_notification(tag_id, photo_paths, photo_links)
@@ -1296,7 +1627,8 @@ class RFIDCameraSystem:
             'photo_links': photo_links
         }
         
-        self.detection_queue.put(detection)
+        self.detection_queue.append(detection)
+        self._detection_event.set()
         self.logger.info(f"Detection queued for batching: {tag_id}")
             
     def simulate_tag_detection(self):
@@ -1311,16 +1643,21 @@ class RFIDCameraSystem:
             "555666777888999"
         ]
         
+        # Draw delays and tags in batches rather than per detection
+        def draws():
+            while True:
+                yield from zip([random.uniform(5, 10) for _ in range(1024)],
+                               random.choices(test_tags, k=1024))
+        draw = draws()
+        
         while self.running:
-            # Wait 5-10 seconds between simulated detections
-            time.sleep(random.uniform(5, 10))
+            # Wait 5-10 seconds between simulated detections, then pick a random tag
+            delay, tag_id = next(draw)
+            time.sleep(delay)
             
             if not self.running:
                 break
                 
-            # Pick a random tag
-            tag_id = random.choice(test_tags)
-            
             if not self.is_duplicate_tag(tag_id):
                 self.process_tag(tag_id)
             
@@ -1343,14 +1680,18 @@ class RFIDCameraSystem:
             
         self.initialize_notifications()
         
-        # Start batch processing and retry system
+        # Workers loop on self.running, so set it before starting them
+        self.running = True
+        
+        # Start I/O, batch processing and retry system
+        self.start_io_processor()
         self.start_batch_processor()
         self.start_retry_processor()
         
         self.logger.info("System initialized successfully, starting main loop...")
         
-        self.running = True
         last_daily_check = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        next_clock_check = 0.0  # Monotonic time of the next wall-clock check
         
         try:
             if simulate_mode:
@@ -1358,32 +1699,25 @@ class RFIDCameraSystem:
                 self.simulate_tag_detection()
             else:
                 # Run real polling
-                poll_command = self.create_poll_command()
-                
                 while self.running:
                     try:
-                        # Check for daily summary (send at 11:59 PM)
-                        now = datetime.now()
-                        if (now.hour == 23 and now.minute == 59 and 
-                            now.date() > last_daily_check.date()):
-                            self.send_daily_summary()
-                            last_daily_check = now
+                        # Check for daily summary (send at 11:59 PM); the wall clock
+                        # only needs reading a couple of times a minute
+                        if time.monotonic() >= next_clock_check:
+                            next_clock_check = time.monotonic() + 20
+                            now = datetime.now()
+                            if (now.hour == 23 and now.minute == 59 and 
+                                now.date() > last_daily_check.date()):
+                                self.send_daily_summary()
+                                last_daily_check = now
                             
                         # Send poll command
-                        self.serial_conn.write(poll_command.encode('ascii'))
+                        self.serial_conn.write(self._poll_cmd_bytes)
+                        
+                        # Read up to the frame terminator (bounded by the port timeout)
+                        raw = self.serial_conn.read_until(b'#', 32)
+                        response = raw.decode('ascii', errors='ignore')
                         
-                        # Read response with timeout
-                        response = ''
-                        start_time = time.time()
-                        while time.time() - start_time < 1.0:
-                            if self.serial_conn.in_waiting > 0:
-                                data = self.serial_conn.read(self.serial_conn.in_waiting)
-                                response += data.decode('ascii', errors='ignore')
-                                
-                                # Check if we have a complete frame
-                                if response.endswith('#'):
-                                    break
-                                    
                         # Process response if we got one
                         if response:
                             tag_id = self.parse_response(response)
@@ -1406,19 +1740,37 @@ class RFIDCameraSystem:
         """Clean up resources"""
         self.logger.info("Cleaning up resources...")
         
-        # Stop batch processor and retry processor
+        # Stop I/O, batch processor and retry processor
+        if self.io_thread and self.io_thread.is_alive():
+            with self._io_lock:
+                self._io_queue.append(None)  # Shutdown signal, queued behind pending work
+            self._io_event.set()
+            self.io_thread.join(timeout=IO_DRAIN_SECONDS)
+            if self.io_thread.is_alive():
+                self.logger.warning(f"I/O worker still busy after {IO_DRAIN_SECONDS}s, abandoning queued detections")
+            
         if self.batch_processor_thread and self.batch_processor_thread.is_alive():
-            self.detection_queue.put(None)  # Shutdown signal
+            self.detection_queue.append(None)  # Shutdown signal
+            self._detection_event.set()
             self.batch_processor_thread.join(timeout=2)
             
         if self.retry_thread and self.retry_thread.is_alive():
+            self._retry_event.set()
             self.retry_thread.join(timeout=2)
             
-        # Cancel any pending timers
-        for timer in self.batch_timers.values():
-            timer.cancel()
-        self.batch_timers.clear()
+        # Stop the rclone daemon
+        self.stop_rclone_daemon()
         
+        # Close the OpenAI session
+        if self._http:
+            self._http.close()
+            
+        # Close the SMTP connection
+        if self._smtp_timer is not None:
+            self._smtp_timer.cancel()
+        with self._smtp_lock:
+            self.smtp_close()
+            
         # Close serial connection
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
@@ -1441,8 +1793,9 @@ class RFIDCameraSystem:
             except Exception as e:
                 self.logger.warning(f"Error stopping GPS monitoring: {e}")
         
-        # Metadata manager doesn't need explicit cleanup but log status
+        # Stop metadata worker pool
         if self.metadata_manager:
+            self.metadata_manager.close()
             self.logger.info("Image metadata manager cleanup completed")
                 
         self.logger.info("System shutdown complete")
@@ -4,6 +4,8 @@ Single Camera Test Version - Pet Chip Reader
 Modified for testing with 1 camera instead of 2
 """
 
+import io
+import mmap
 import os
 import sys
 import time
@@ -17,9 +19,10 @@ import base64
 import json
 import threading
 import queue
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
 from datetime import datetime, timedelta
 from pathlib import Path
+from email.message import EmailMessage
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
@@ -35,6 +38,25 @@ except ImportError:
     print("ERROR: picamera2 not installed. Run: sudo apt install python3-picamera2")
     sys.exit(1)
 
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Most recent (chip, day) keys remembered for immediate-notification dedupe
+NOTIFIED_CACHE_SIZE = 4096
+
+# Messages sent before the SMTP connection is recycled
+SMTP_MESSAGES_PER_CONNECTION = 100
+
+# Bounding box and quality for daily summary attachments
+SUMMARY_THUMBNAIL_SIZE = (320, 240)
+SUMMARY_THUMBNAIL_QUALITY = 70
+
+# How often buffered detections are appended to the daily log
+DETECTION_LOG_FLUSH_SECONDS = 5
+
 
 class RFIDCameraSystem:
     """Single camera test version of RFID camera system"""
@@ -54,6 +76,7 @@ class RFIDCameraSystem:
         self.running = False
         self.last_tag_time = {}  # For deduplication
         self.last_notification_time = {}  # For notification deduplication (60s)
+        self._recent = OrderedDict()  # chip_id -> (monotonic time, queued detection)
         
         # Batching system
         self.detection_queue = queue.Queue()
@@ -62,18 +85,43 @@ class RFIDCameraSystem:
         self.batch_timers = {}  # chip_id -> timer
         self.encounter_history = defaultdict(deque)  # chip_id -> deque of timestamps
         
+        # Uploads and immediate notifications run on an outbound worker so a
+        # slow rclone or SMTP server never stalls serial polling
+        self._notify_q = queue.Queue(maxsize=64)
+        self._notify_thread = None
+        
+        # Immediate alerts arriving within one window go out as a single email
+        self._alert_window = self.config['alert_window_seconds']
+        self._pending_alerts = []  # (chip_id, timestamp, photo_paths, photo_links)
+        self._alert_timer = None
+        self._alert_lock = threading.Lock()
+        
         # Local backup and retry system
         self.local_backup_dir = Path(self.config['photo_dir']) / 'backup'
         self.local_backup_dir.mkdir(exist_ok=True)
         self.upload_retry_queue = queue.Queue()
         self.retry_thread = None
-        self.immediate_notifications_sent = set()  # Track immediate notifications to avoid duplicates
+        self._notif_seen = OrderedDict()  # Bounded LRU of notified (chip, day) keys
+        self._notif_lock = threading.Lock()  # Polling thread marks, summary timer prunes
+        
+        # Daily log lines, appended to disk by the retry thread in one write
+        self._log_buf = []
+        self._log_lock = threading.Lock()
         
         # Initialize components
         self.serial_conn = None
+        self._poll_bytes = b''  # Encoded poll frame, set by initialize_serial
         self.camera = None  # Single camera for testing
         self.twilio_client = None
         
+        # Persistent SMTP connection shared by every email path
+        self._smtp = None
+        self._smtp_sent = 0
+        self._smtp_lock = threading.Lock()
+        self._msg_headers = None  # (From, To) for alert emails
+        self._is_sms_gateway = False  # Alert address is an SMS gateway (no subject, no attachments)
+        self._summary_timer = None  # Fires the daily summary at 23:59
+        
         # Setup signal handlers
         signal.signal(signal.SIGTERM, self.signal_handler)
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -111,6 +159,8 @@ class RFIDCameraSystem:
             'poll_fmt': os.getenv('POLL_FMT', 'D'),
             'poll_interval': float(os.getenv('POLL_INTERVAL', '0.5')),
             'dedupe_seconds': int(os.getenv('DEDUPE_SECONDS', '2')),
+            'debounce_seconds': float(os.getenv('DEBOUNCE_SECONDS', '30')),
+            'alert_window_seconds': float(os.getenv('ALERT_WINDOW_SECONDS', '20')),
             'capture_on_any': os.getenv('CAPTURE_ON_ANY', 'true').lower() == 'true',
             'lost_tag': os.getenv('LOST_TAG', ''),
             'notify_on_any': os.getenv('NOTIFY_ON_ANY', 'false').lower() == 'true',
@@ -156,6 +206,8 @@ class RFIDCameraSystem:
                 baudrate=self.config['baud'],
                 timeout=1.0
             )
+            # The poll frame never changes, so encode it once
+            self._poll_bytes = self.create_poll_command().encode('ascii')
             self.logger.info(f"Serial connection established on {self.config['port']} at {self.config['baud']} baud")
             return True
         except serial.SerialException as e:
@@ -182,8 +234,8 @@ class RFIDCameraSystem:
             self.camera.set_controls({"AfMode": 2})  # Continuous AF
             self.camera.start()
             
-            # Allow time for camera to initialize
-            time.sleep(2)
+            # Wait for the first frame rather than a fixed warm-up delay
+            self.camera.capture_metadata()
             
             self.logger.info("Camera initialized successfully (single camera test mode)")
             return True
@@ -205,7 +257,135 @@ class RFIDCameraSystem:
         # Test SMTP if configured
         if self.config['smtp_user'] and self.config['smtp_pass']:
             self.logger.info("Email notifications configured")
+        self._msg_headers = (self.config['email_from'], self.config['alert_to_email'])
+        self._is_sms_gateway = '@msg.fi.google.com' in (self.config.get('alert_to_email') or '')
             
+        self._notify_thread = threading.Thread(target=self._outbound_worker, daemon=True)
+        self._notify_thread.start()
+        
+        self._schedule_daily_summary()
+        
+    def _schedule_daily_summary(self, skip_today=False):
+        """Arm a timer for the next 11:59 PM daily summary"""
+        now = datetime.now()
+        target = now.replace(hour=23, minute=59, second=0, microsecond=0)
+        if target <= now or skip_today:
+            target += timedelta(days=1)
+        self._summary_timer = threading.Timer((target - now).total_seconds(), self._daily_summary_and_reschedule)
+        self._summary_timer.daemon = True
+        self._summary_timer.start()
+        
+    def _daily_summary_and_reschedule(self):
+        """Re-arm for tomorrow, then send the daily summary and forget old notified chips"""
+        # Recompute from the clock rather than adding 24h so DST changes don't drift it
+        self._schedule_daily_summary(skip_today=True)
+        self.send_daily_summary()
+        self._prune_notified()
+        
+    def queue_outbound(self, item):
+        """Queue work for the outbound worker, dropping the oldest entry if it is backed up"""
+        while True:
+            try:
+                self._notify_q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._notify_q.get_nowait()
+                    if dropped is not None:
+                        self.logger.warning(f"Outbound queue full, dropped detection for {dropped[0]['chip_id']}")
+                except queue.Empty:
+                    pass
+                    
+    def _outbound_worker(self):
+        """Background worker that uploads photos, sends immediate notifications and queues batching"""
+        while True:
+            item = self._notify_q.get()
+            if item is None:  # Shutdown signal
+                break
+                
+            detection, notify = item
+            try:
+                # Upload photos to get links (with local backup on failure)
+                if detection['photo_paths']:
+                    detection['photo_links'] = self.upload_photos(detection['photo_paths'])
+                    
+                if notify:
+                    self.send_immediate_notification(detection['chip_id'], detection['photo_paths'],
+                                                     detection['photo_links'])
+                    
+                # Queue detection for detailed batching
+                self.detection_queue.put(detection)
+                self.logger.info(f"Detection queued for batching: {detection['chip_id']}")
+                
+            except Exception as e:
+                self.logger.error(f"Outbound worker error: {e}")
+                
+    def _build_msg(self, body, subject=None):
+        """Build a plain-text alert email with the configured envelope headers"""
+        msg = EmailMessage()
+        msg['From'], msg['To'] = self._msg_headers
+        if subject:
+            msg['Subject'] = subject
+        # Non-ASCII bodies go out base64-encoded, as MIMEText sent them
+        msg.set_content(body, cte=None if body.isascii() else 'base64')
+        return msg
+
+    def _send(self, body, subject=None, attachments=()):
+        """Send an alert email, with optional JPEG attachments, over the shared SMTP session"""
+        msg = self._build_msg(body, subject)
+        for photo_path in attachments:
+            photo_path = Path(photo_path)
+            # Base64-encode straight from a read-only mapping instead of copying the JPEG first
+            with open(photo_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    msg.add_attachment(view, maintype='image', subtype='jpeg', filename=photo_path.name)
+        self.smtp_send(msg)
+        self.logger.info(f"Email sent successfully ({len(attachments)} attachment(s), subject: {bool(subject)})")
+        
+    def smtp_connect(self):
+        """Open and authenticate an SMTP connection"""
+        server = smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port'], timeout=10)
+        server.starttls()
+        server.login(self.config['smtp_user'], self.config['smtp_pass'])
+        return server
+        
+    def smtp_close(self):
+        """Close the persistent SMTP connection (caller holds the lock)"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+            
+    def smtp_send(self, msg):
+        """Send over the persistent SMTP connection, reconnecting once if it has dropped"""
+        with self._smtp_lock:
+            for attempt in range(2):
+                try:
+                    if self._smtp is None:
+                        self._smtp = self.smtp_connect()
+                        self._smtp_sent = 0
+                    self._smtp.send_message(msg)
+                    break
+                except smtplib.SMTPServerDisconnected:
+                    self.smtp_close()
+                    if attempt:
+                        raise
+                except smtplib.SMTPException:
+                    # Auth, recipient and data errors would only fail again on a new session
+                    raise
+                except OSError:
+                    # Socket-level failure (reset, timeout): reconnect and try once more
+                    self.smtp_close()
+                    if attempt:
+                        raise
+                        
+            # Recycle the connection periodically to stay under per-session limits
+            self._smtp_sent += 1
+            if self._smtp_sent >= SMTP_MESSAGES_PER_CONNECTION:
+                self.smtp_close()
+                
     def calculate_bcc(self, data):
         """Calculate BCC (XOR checksum) for A04 protocol"""
         bcc = 0
@@ -507,6 +687,7 @@ class RFIDCameraSystem:
             if best_detection:
                 # Calculate encounter statistics
                 stats = self._calculate_encounter_stats(chip_id)
+                stats['reads'] = sum(d.get('count', 1) for d in batch)
                 
                 # Send the final notification
                 self._send_batch_notification(best_detection, stats)
@@ -633,6 +814,8 @@ class RFIDCameraSystem:
             body += f"\nDate: {date_str}\nTime: {time_str}"
             body += f"\nRecent visits: {stats['recent_encounters']} in {stats['window_minutes']} min"
             body += f"\nTotal visits: {stats['total_encounters']}"
+            if stats.get('reads', 1) > 1:
+                body += f"\nReads this visit: {stats['reads']}"
             
             # Add photo link
             if photo_links and len(photo_links) > 0:
@@ -640,23 +823,10 @@ class RFIDCameraSystem:
             elif self.config['rclone_remote']:
                 body += "\nPhoto: Uploaded to Google Drive"
             
-            # Send notification
-            is_sms_gateway = '@msg.fi.google.com' in self.config['alert_to_email']
-            
-            msg = MIMEText(body)
-            msg['From'] = self.config['email_from']
-            msg['To'] = self.config['alert_to_email']
-            
-            # Only add subject if not SMS gateway
-            if not is_sms_gateway:
-                msg['Subject'] = subject
-            
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            # Send notification, only adding the subject if not SMS gateway
+            self._send(body, None if self._is_sms_gateway else subject)
                 
-            self.logger.info(f"Batched notification sent for {chip_id} (animal: {animal_description or 'unknown'}) - SMS mode: {is_sms_gateway}")
+            self.logger.info(f"Batched notification sent for {chip_id} (animal: {animal_description or 'unknown'}) - SMS mode: {self._is_sms_gateway}")
             
             # Log for daily summary
             self.log_detection(chip_id, photo_paths)
@@ -674,8 +844,12 @@ class RFIDCameraSystem:
         self.logger.info("Upload retry processor started")
         
     def _retry_processor_worker(self):
-        """Background worker that retries failed uploads"""
+        """Background worker that retries failed uploads and flushes the detection log"""
+        last_flush = time.monotonic()
         while self.running:
+            if time.monotonic() - last_flush >= DETECTION_LOG_FLUSH_SECONDS:
+                self.flush_detection_log()
+                last_flush = time.monotonic()
             try:
                 # Wait for failed uploads to retry
                 if not self.upload_retry_queue.empty():
@@ -756,77 +930,47 @@ class RFIDCameraSystem:
         except TwilioException as e:
             self.logger.error(f"Failed to send SMS: {e}")
             
-    def send_email(self, tag_id, photo_links=None, photo_paths=None):
-        """Send email notification via SMTP"""
-        if not self.config['smtp_user'] or not self.config['alert_to_email']:
-            return
-            
-        try:
-            # Check if this is the lost pet
-            is_lost_pet = self.config['lost_tag'] and tag_id == self.config['lost_tag']
-            
-            # Get current date and time with day name
-            now = datetime.now()
-            date_str = now.strftime('%A, %B %d, %Y')  # Monday, September 29, 2025
-            time_str = now.strftime('%H:%M')
-            
-            # Try to identify the animal if photo is available
-            animal_description = None
-            if photo_paths and len(photo_paths) > 0 and self.config['animal_identification']:
-                animal_description = self.identify_animal(photo_paths[0])
-            
-            # Create message with animal identification and full date
-            if is_lost_pet:
-                subject = "🚨 LOST PET FOUND!"
-                if animal_description:
-                    body = f"🚨 LOST PET DETECTED!\nAnimal: {animal_description}\nChip: {tag_id}\nDate: {date_str}\nTime: {time_str}"
-                else:
-                    body = f"🚨 LOST PET DETECTED!\nChip: {tag_id}\nDate: {date_str}\nTime: {time_str}"
-            else:
-                subject = "🐾 Pet Alert"
-                if animal_description:
-                    body = f"🐾 Pet detected\nAnimal: {animal_description}\nChip: {tag_id}\nDate: {date_str}\nTime: {time_str}"
-                else:
-                    body = f"🐾 Pet detected\nChip: {tag_id}\nDate: {date_str}\nTime: {time_str}"
-            
-            # Add specific photo link if available
-            if photo_links and len(photo_links) > 0:
-                # Add explicit Google Drive link as plain text
-                body += f"\nPhoto: {photo_links[0]}"
-            elif self.config['rclone_remote']:
-                # Fallback to indicating photo was captured
-                body += "\nPhoto: Uploaded to Google Drive"
-                
-            # Send as plain text
-            msg = MIMEText(body)
-            msg['From'] = self.config['email_from']
-            msg['To'] = self.config['alert_to_email'] 
-            msg['Subject'] = subject
-            
-            # Create SMTP session
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+    def send_immediate_notification(self, chip_id, photo_paths, photo_links):
+        """Queue an immediate notification, coalescing alerts that arrive within the alert window"""
+        with self._alert_lock:
+            self._pending_alerts.append((chip_id, datetime.now(), photo_paths, photo_links))
+            if self._alert_timer is None:
+                self._alert_timer = threading.Timer(self._alert_window, self._flush_alerts)
+                self._alert_timer.daemon = True
+                self._alert_timer.start()
                 
-            self.logger.info("Email sent successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to send email: {e}")
+    def _flush_alerts(self):
+        """Send the alerts gathered during the window as one notification"""
+        with self._alert_lock:
+            alerts, self._pending_alerts = self._pending_alerts, []
+            self._alert_timer = None
+        if not alerts:
+            return
             
-    def send_immediate_notification(self, chip_id, photo_paths, photo_links):
-        """Send immediate notification when pet is first detected"""
         try:
-            timestamp = datetime.now()
+            chip_id, timestamp, photo_paths, photo_links = alerts[0]
             time_str = timestamp.strftime('%H:%M')
             date_str = timestamp.strftime('%A, %B %d, %Y')
             
             # Create immediate notification message with full date/time info
-            message = f"🐾 Pet detected!\n"
-            message += f"📅 {date_str}\n"
-            message += f"🕐 {time_str}\n"
-            message += f"🏷️ Chip: {chip_id}\n"
-            
+            if len(alerts) == 1:
+                message = f"🐾 Pet detected!\n"
+                message += f"📅 {date_str}\n"
+                message += f"🕐 {time_str}\n"
+                message += f"🏷️ Chip: {chip_id}\n"
+                subject = f"Pet Detection Alert - {chip_id}"
+            else:
+                chip_ids = list(dict.fromkeys(alert[0] for alert in alerts))
+                message = f"🐾 {len(alerts)} pet detections!\n"
+                message += f"📅 {date_str}\n"
+                message += f"🕐 {time_str}-{alerts[-1][1].strftime('%H:%M')}\n"
+                message += f"🏷️ Chips: {', '.join(chip_ids)}\n"
+                subject = f"Pet Detection Alert - {len(alerts)} detections"
+                # Link the first photo that made it to the cloud
+                linked = next((alert for alert in alerts if alert[3]), None)
+                if linked:
+                    photo_paths, photo_links = linked[2], linked[3]
+                    
             # Add photo link or fallback message
             if photo_links:
                 message += f"📸 Photo: {photo_links[0]}\n"
@@ -849,131 +993,54 @@ class RFIDCameraSystem:
                 
             if self.config.get('alert_to_email'):
                 try:
-                    # Check if this is SMS gateway email (no subject needed)
-                    is_sms_gateway = '@msg.fi.google.com' in self.config['alert_to_email']
-                    
-                    if is_sms_gateway:
-                        # Send without subject for SMS gateway
+                    if self._is_sms_gateway:
+                        # Send without subject for SMS gateway, and don't attach photos - just mention it
                         if not photo_links and photo_paths:
-                            # For SMS gateway, don't attach photos - just mention it
-                            sms_message = message.replace("Photo captured locally (uploading...)", "Photo captured (uploading to cloud)")
-                            self.send_simple_email_no_subject(sms_message)
-                        else:
-                            self.send_simple_email_no_subject(message)
+                            message = message.replace("Photo captured locally (uploading...)", "Photo captured (uploading to cloud)")
+                        self._send(message)
                     else:
-                        # Regular email with subject
-                        subject = f"Pet Detection Alert - {chip_id}"
-                        if not photo_links and photo_paths:
-                            self.send_email_with_attachment(message, subject, photo_paths[0])
-                        else:
-                            self.send_simple_email(message, subject)
+                        # Regular email with subject, attaching the photo when there is no link yet
+                        attachments = photo_paths[:1] if not photo_links and photo_paths else ()
+                        self._send(message, subject, attachments)
                             
                     notification_sent = True
                 except Exception as e:
                     self.logger.warning(f"Email notification failed: {e}")
                     
             if notification_sent:
-                self.logger.info(f"Immediate notification sent for {chip_id}")
+                self.logger.info(f"Immediate notification sent for {len(alerts)} alert(s): {', '.join(alert[0] for alert in alerts)}")
             else:
                 self.logger.warning("No notification methods configured or all failed")
             
         except Exception as e:
             self.logger.error(f"Failed to send immediate notification: {e}")
             
-    def send_email_with_attachment(self, body, subject, photo_path):
-        """Send email with photo attachment when upload fails"""
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = self.config['email_from']
-            msg['To'] = self.config['alert_to_email']
-            msg['Subject'] = subject
-            
-            # Add text body
-            msg.attach(MIMEText(body))
-            
-            # Add photo attachment
-            with open(photo_path, 'rb') as f:
-                img_data = f.read()
-                img = MIMEImage(img_data)
-                img.add_header('Content-Disposition', f'attachment; filename="{photo_path.name}"')
-                msg.attach(img)
-            
-            # Send email
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
-                
-            self.logger.info(f"Email with attachment sent successfully: {photo_path.name}")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to send email with attachment: {e}")
-            
-    def send_simple_email(self, body, subject):
-        """Send simple text email"""
-        try:
-            # Send as plain text
-            msg = MIMEText(body)
-            msg['From'] = self.config['email_from']
-            msg['To'] = self.config['alert_to_email'] 
-            msg['Subject'] = subject
-            
-            # Create SMTP session
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
-                
-            self.logger.info("Simple email sent successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to send simple email: {e}")
-            raise
-            
-    def send_simple_email_no_subject(self, body):
-        """Send simple text email without subject (for SMS gateways)"""
-        try:
-            # Send as plain text without subject
-            msg = MIMEText(body)
-            msg['From'] = self.config['email_from']
-            msg['To'] = self.config['alert_to_email'] 
-            # No Subject header for SMS gateway
-            
-            # Create SMTP session
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
-                
-            self.logger.info("SMS gateway email sent successfully (no subject)")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to send SMS gateway email: {e}")
-            raise
-            
     def log_detection(self, tag_id, photo_paths):
-        """Log detection for daily summary"""
-        try:
-            from pathlib import Path
-            log_file = Path(self.config['photo_dir']).parent / 'daily_detections.log'
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            with open(log_file, 'a') as f:
-                photo_names = [p.name for p in photo_paths] if photo_paths else []
-                f.write(f"{timestamp},{tag_id},{';'.join(photo_names)}\n")
+        """Buffer detection for daily summary"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        photo_names = [p.name for p in photo_paths] if photo_paths else []
+        with self._log_lock:
+            self._log_buf.append(f"{timestamp},{tag_id},{';'.join(photo_names)}\n")
+            
+    def flush_detection_log(self):
+        """Append buffered detections to the daily log with a single write"""
+        with self._log_lock:
+            if not self._log_buf:
+                return
+            try:
+                log_file = Path(self.config['photo_dir']).parent / 'daily_detections.log'
+                with open(log_file, 'a') as f:
+                    f.writelines(self._log_buf)
+                self._log_buf.clear()
+            except Exception as e:
+                # Keep the lines buffered and try again on the next flush
+                self.logger.error(f"Failed to log detection: {e}")
                 
-        except Exception as e:
-            self.logger.error(f"Failed to log detection: {e}")
-            
     def send_daily_summary(self):
         """Send daily summary of all detections with thumbnails"""
         try:
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.image import MIMEImage
-            import os
-            from pathlib import Path
-            
-            # Read daily detection log
+            # Read daily detection log, including anything still buffered
+            self.flush_detection_log()
             log_file = Path(self.config['photo_dir']).parent / 'daily_detections.log'
             if not log_file.exists():
                 return
@@ -1023,58 +1090,87 @@ class RFIDCameraSystem:
                     if photo_path.exists():
                         try:
                             # Create thumbnail and attach
-                            with open(photo_path, 'rb') as f:
-                                img_data = f.read()
-                                img = MIMEImage(img_data)
-                                img.add_header('Content-Disposition', f'attachment; filename={photo_name}')
-                                msg.attach(img)
+                            img = MIMEImage(self._summary_thumbnail(photo_path), 'jpeg')
+                            img.add_header('Content-Disposition', f'attachment; filename={photo_name}')
+                            msg.attach(img)
                         except Exception as e:
                             self.logger.warning(f"Failed to attach {photo_name}: {e}")
             
-            # Send email
-            with smtplib.SMTP(self.config['smtp_host'], self.config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.config['smtp_user'], self.config['smtp_pass'])
-                server.send_message(msg)
+            # Send email (raises unless the server accepted it)
+            self.smtp_send(msg)
                 
             self.logger.info(f"Daily summary sent with {len(detections)} detections")
             
-            # Clear the log file for next day
+            # Clear the log file for next day, only once the summary is delivered
             log_file.unlink()
             
         except Exception as e:
             self.logger.error(f"Failed to send daily summary: {e}")
             
+    def _summary_thumbnail(self, photo_path):
+        """Return JPEG bytes for a summary attachment, downscaled when Pillow is available"""
+        if PIL_AVAILABLE:
+            with Image.open(photo_path) as img:
+                img.draft('RGB', SUMMARY_THUMBNAIL_SIZE)  # Let libjpeg decode at reduced scale
+                img.thumbnail(SUMMARY_THUMBNAIL_SIZE)
+                buffer = io.BytesIO()
+                img.convert('RGB').save(buffer, 'JPEG', quality=SUMMARY_THUMBNAIL_QUALITY)
+            return buffer.getvalue()
+            
+        with open(photo_path, 'rb') as f:
+            return f.read()
+            
     def process_tag(self, tag_id):
         """Process a detected tag - send immediate notification then queue for detailed batching"""
         self.logger.info(f"Tag detected: {tag_id}")
         
-        photo_paths = []
-        photo_links = []
-        
+        # Repeat reads within the debounce window fold into the detection already
+        # queued for this chip rather than capturing and uploading again
+        now = time.monotonic()
+        cutoff = now - self.config['debounce_seconds']
+        while self._recent and next(iter(self._recent.values()))[0] <= cutoff:
+            self._recent.popitem(last=False)
+        recent = self._recent.get(tag_id)
+        if recent:
+            recent[1]['count'] += 1
+            self.logger.info(f"Repeat read of {tag_id} folded into queued detection ({recent[1]['count']} reads)")
+            return
+            
         # Always capture photos for analysis
         photo_paths = self.capture_photo(tag_id)
         
-        # Upload photos to get links (with local backup on failure)
-        if photo_paths:
-            photo_links = self.upload_photos(photo_paths)
-            
         # Send immediate notification if this is first contact for this chip
-        notification_key = f"{tag_id}_{datetime.now().strftime('%Y%m%d')}"
-        if notification_key not in self.immediate_notifications_sent:
-            self.send_immediate_notification(tag_id, photo_paths, photo_links)
-            self.immediate_notifications_sent.add(notification_key)
+        notify = not self._seen_and_mark((tag_id, datetime.now().strftime('%Y%m%d')))
             
-        # Queue detection for detailed batching
+        # Upload, notify and batch on the outbound worker
         detection = {
             'chip_id': tag_id,
             'timestamp': datetime.now(),
             'photo_paths': photo_paths,
-            'photo_links': photo_links
+            'photo_links': [],
+            'count': 1  # Reads folded into this detection
         }
         
-        self.detection_queue.put(detection)
-        self.logger.info(f"Detection queued for batching: {tag_id}")
+        self._recent[tag_id] = (now, detection)
+        self.queue_outbound((detection, notify))
+            
+    def _seen_and_mark(self, key):
+        """Return True if key was already notified, otherwise remember it"""
+        with self._notif_lock:
+            if key in self._notif_seen:
+                self._notif_seen.move_to_end(key)
+                return True
+            self._notif_seen[key] = None
+            if len(self._notif_seen) > NOTIFIED_CACHE_SIZE:
+                self._notif_seen.popitem(last=False)
+            return False
+        
+    def _prune_notified(self):
+        """Forget notified keys from previous days"""
+        today = datetime.now().strftime('%Y%m%d')
+        with self._notif_lock:
+            for key in [k for k in self._notif_seen if k[1] != today]:
+                del self._notif_seen[key]
             
     def simulate_tag_detection(self):
         """Simulate tag detection for testing"""
@@ -1088,16 +1184,21 @@ class RFIDCameraSystem:
             "555666777888999"
         ]
         
+        # Draw delays and tags in batches rather than per detection
+        def draws():
+            while True:
+                yield from zip([random.uniform(5, 10) for _ in range(1024)],
+                               random.choices(test_tags, k=1024))
+        draw = draws()
+        
         while self.running:
-            # Wait 5-10 seconds between simulated detections
-            time.sleep(random.uniform(5, 10))
+            # Wait 5-10 seconds between simulated detections, then pick a random tag
+            delay, tag_id = next(draw)
+            time.sleep(delay)
             
             if not self.running:
                 break
                 
-            # Pick a random tag
-            tag_id = random.choice(test_tags)
-            
             if not self.is_duplicate_tag(tag_id):
                 self.process_tag(tag_id)
             
@@ -1120,47 +1221,29 @@ class RFIDCameraSystem:
             
         self.initialize_notifications()
         
+        # Workers loop on self.running, so set it before starting them
+        self.running = True
+        
         # Start batch processing and retry system
         self.start_batch_processor()
         self.start_retry_processor()
         
         self.logger.info("System initialized successfully, starting main loop...")
         
-        self.running = True
-        last_daily_check = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
         try:
             if simulate_mode:
                 # Run simulation
                 self.simulate_tag_detection()
             else:
                 # Run real polling
-                poll_command = self.create_poll_command()
-                
                 while self.running:
                     try:
-                        # Check for daily summary (send at 11:59 PM)
-                        now = datetime.now()
-                        if (now.hour == 23 and now.minute == 59 and 
-                            now.date() > last_daily_check.date()):
-                            self.send_daily_summary()
-                            last_daily_check = now
-                            
                         # Send poll command
-                        self.serial_conn.write(poll_command.encode('ascii'))
+                        self.serial_conn.write(self._poll_bytes)
+                        
+                        # Block until the frame terminator arrives (bounded by the 1s port timeout)
+                        response = self.serial_conn.read_until(b'#', 64).decode('ascii', errors='ignore')
                         
-                        # Read response with timeout
-                        response = ''
-                        start_time = time.time()
-                        while time.time() - start_time < 1.0:
-                            if self.serial_conn.in_waiting > 0:
-                                data = self.serial_conn.read(self.serial_conn.in_waiting)
-                                response += data.decode('ascii', errors='ignore')
-                                
-                                # Check if we have a complete frame
-                                if response.endswith('#'):
-                                    break
-                                    
                         # Process response if we got one
                         if response:
                             tag_id = self.parse_response(response)
@@ -1183,7 +1266,11 @@ class RFIDCameraSystem:
         """Clean up resources"""
         self.logger.info("Cleaning up resources...")
         
-        # Stop batch processor and retry processor
+        # Stop outbound worker, batch processor and retry processor
+        if self._notify_thread and self._notify_thread.is_alive():
+            self.queue_outbound(None)  # Shutdown signal
+            self._notify_thread.join(timeout=2)
+            
         if self.batch_processor_thread and self.batch_processor_thread.is_alive():
             self.detection_queue.put(None)  # Shutdown signal
             self.batch_processor_thread.join(timeout=2)
@@ -1191,11 +1278,26 @@ class RFIDCameraSystem:
         if self.retry_thread and self.retry_thread.is_alive():
             self.retry_thread.join(timeout=2)
             
+        # Write out any buffered detections
+        self.flush_detection_log()
+            
         # Cancel any pending timers
         for timer in self.batch_timers.values():
             timer.cancel()
         self.batch_timers.clear()
+        if self._summary_timer:
+            self._summary_timer.cancel()
+            
+        # Send any alerts still waiting out their window
+        with self._alert_lock:
+            if self._alert_timer:
+                self._alert_timer.cancel()
+        self._flush_alerts()
         
+        # Close the SMTP connection
+        with self._smtp_lock:
+            self.smtp_close()
+            
         # Close serial connection
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
@@ -6,6 +6,7 @@ import os
 import subprocess
 import serial
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 def check_service():
     """Check if rfid_cam service is running"""
@@ -16,23 +17,21 @@ def check_service():
     except:
         return False
 
-def check_devices():
-    """Check if hardware devices are accessible"""
-    devices = {}
-    
-    # Check RFID reader
-    try:
-        with serial.Serial('/dev/ttyUSB0', 9600, timeout=1):
-            devices['RFID'] = True
-    except:
-        devices['RFID'] = False
-    
-    # Check GPS device
+def _probe(port):
+    """Return True if the serial port can be opened"""
     try:
-        with serial.Serial('/dev/ttyACM0', 9600, timeout=1):
-            devices['GPS'] = True
+        with serial.Serial(port, 9600, timeout=1):
+            return True
     except:
-        devices['GPS'] = False
+        return False
+
+def check_devices():
+    """Check if hardware devices are accessible"""
+    # Open the RFID reader and GPS ports in parallel
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        futs = {name: ex.submit(_probe, port)
+                for name, port in [('RFID', '/dev/ttyUSB0'), ('GPS', '/dev/ttyACM0')]}
+        devices = {name: fut.result() for name, fut in futs.items()}
     
     return devices
 